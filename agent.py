@@ -1,3 +1,4 @@
+import logging
 import os
 import sys
 import warnings
@@ -16,7 +17,7 @@ from mcp.client.streamable_http import streamablehttp_client
 from langchain_mcp_adapters.tools import load_mcp_tools
 from graph import build_graph
 from utils.bedrock_config import normalize_aws_env, resolve_bedrock_model_id
-from utils.mcp_storage import get_mcp_servers
+from utils.mcp_storage import get_mcp_servers, get_live_session
 from exceptions import (
     MCPConnectionError,
     MCPToolLoadError,
@@ -24,6 +25,8 @@ from exceptions import (
     ConfigurationError,
 )
 
+logger = logging.getLogger(__name__)
+
 # Lock to prevent concurrent graph rebuilds
 _rebuild_lock = asyncio.Lock()
 
@@ -157,7 +160,7 @@ class AgentRuntime:
         seen_tool_names = set()  # Track tool names to prevent duplicates
 
         async def connect_and_load(label: str, url: str):
-            print(f"🔌 [Agent] Connecting to {label} at {url} ...")
+            logger.debug(f"🔌 [Agent] Connecting to {label} at {url} ...")
 
             # Detect transport type based on URL path
             # Streamable-HTTP servers use /mcp endpoint, SSE servers use /sse endpoint
@@ -166,7 +169,7 @@ class AgentRuntime:
 
             # Use streamable-http transport if URL indicates it
             if is_streamable_http:
-                print(f"ℹ️  [Agent] Using streamable-http transport for {label}")
+                logger.debug(f"ℹ️  [Agent] Using streamable-http transport for {label}")
 
                 try:
                     # Use streamable-http client
@@ -192,14 +195,14 @@ class AgentRuntime:
                         raise
                     raise MCPToolLoadError(label, str(e))
 
-                print(
+                logger.info(
                     f"✅ [Agent] Tools Loaded from {label}: {[t.name for t in tools]}"
                 )
 
                 # Add tools, skipping duplicates
                 for t in tools:
                     if t.name in seen_tool_names:
-                        print(
+                        logger.warning(
                             f"⚠️ [Agent] Duplicate tool name '{t.name}' from {label}. Skipping duplicate."
                         )
                         continue
@@ -212,7 +215,7 @@ class AgentRuntime:
 
             # Default to SSE connection for other servers
             if not is_sse:
-                print(f"ℹ️  [Agent] Using SSE transport for {label} (default)")
+                logger.debug(f"ℹ️  [Agent] Using SSE transport for {label} (default)")
 
             try:
                 sse = await exit_stack.enter_async_context(
@@ -237,12 +240,12 @@ class AgentRuntime:
                     raise
                 raise MCPToolLoadError(label, str(e))
 
-            print(f"✅ [Agent] Tools Loaded from {label}: {[t.name for t in tools]}")
+            logger.info(f"✅ [Agent] Tools Loaded from {label}: {[t.name for t in tools]}")
 
             # Add tools, skipping duplicates (keep first occurrence)
             for t in tools:
                 if t.name in seen_tool_names:
-                    print(
+                    logger.warning(
                         f"⚠️ [Agent] Duplicate tool name '{t.name}' from {label}. Skipping duplicate."
                     )
                     continue
@@ -256,7 +259,7 @@ class AgentRuntime:
 
         async def load_from_chainlit_session(label: str, chainlit_session):
             """Load tools from a Chainlit-managed session (for stdio-based servers)"""
-            print(
+            logger.debug(
                 f"🔌 [Agent] Loading {label} from Chainlit session (stdio transport) ..."
             )
             try:
@@ -265,14 +268,14 @@ class AgentRuntime:
                     raise MCPToolLoadError(
                         label, "Chainlit session connected but returned no tools"
                     )
-                print(
+                logger.info(
                     f"✅ [Agent] Tools Loaded from {label}: {[t.name for t in tools]}"
                 )
 
                 # Add tools, skipping duplicates
                 for t in tools:
                     if t.name in seen_tool_names:
-                        print(
+                        logger.warning(
                             f"⚠️ [Agent] Duplicate tool name '{t.name}' from {label}. Skipping duplicate."
                         )
                         continue
@@ -290,9 +293,9 @@ class AgentRuntime:
         try:
             # Get MCP servers from in-memory storage for THIS USER
             mcp_servers = get_mcp_servers(user_id=uid)
-            print(f"🔍 [Agent] Building graph for user '{uid}' with {len(mcp_servers)} MCP server(s)")
+            logger.info(f"🔍 [Agent] Building graph for user '{uid}' with {len(mcp_servers)} MCP server(s)")
 
-            for server in mcp_servers.values():
+            for server_key, server in mcp_servers.items():
                 # IMPORTANT: Prefer URL-based connection over chainlit_session
                 # The chainlit_session doesn't work reliably when used from background tasks
                 # (e.g., delayed_rebuild in ECS/AWS environments)
@@ -300,15 +303,13 @@ class AgentRuntime:
                 if "url" in server and server["url"]:
                     # SSE or streamable-http connection via URL (ngrok, remote MCP servers)
                     await connect_and_load(server["name"], server["url"])
-                elif "chainlit_session" in server and server["chainlit_session"]:
+                elif (chainlit_session := get_live_session(server_key, user_id=uid)) is not None:
                     # stdio-based servers (like Code Formatter) - no URL, use Chainlit session
-                    await load_from_chainlit_session(
-                        server["name"], server["chainlit_session"]
-                    )
+                    await load_from_chainlit_session(server["name"], chainlit_session)
                 else:
                     # Server has no URL and no Chainlit session
                     # This means it's not properly configured - skip it
-                    print(
+                    logger.warning(
                         f"⚠️  [Agent] Skipping {server.get('name', 'unknown')} - no URL or Chainlit session. Please add this server via Chainlit UI."
                     )
 
@@ -336,14 +337,14 @@ class AgentRuntime:
             except Exception as e:
                 raise GraphBuildError(str(e))
 
-            print(f"✅ [Agent] Graph rebuilt for user '{uid}' with {len(tools_all)} unique tools")
+            logger.info(f"✅ [Agent] Graph rebuilt for user '{uid}' with {len(tools_all)} unique tools")
 
         except (MCPConnectionError, MCPToolLoadError, GraphBuildError, ConfigurationError):
             # Re-raise custom exceptions as-is
             await exit_stack.aclose()
             raise
         except Exception as e:
-            print(f"❌ [Agent] Unexpected error during graph rebuild for user '{uid}': {e}")
+            logger.error(f"❌ [Agent] Unexpected error during graph rebuild for user '{uid}': {e}")
             await exit_stack.aclose()
             raise GraphBuildError(str(e))
 
@@ -391,12 +392,12 @@ class AgentRuntime:
                             # These are non-critical cleanup warnings
                             pass
                         else:
-                            print(
+                            logger.warning(
                                 f"⚠️ [Agent] Error closing old exit stack for user '{uid}' (non-critical): {e}"
                             )
                 except Exception as e:
                     # Log but don't fail - connections might already be closed
-                    print(f"⚠️ [Agent] Error closing old exit stack for user '{uid}' (non-critical): {e}")
+                    logger.warning(f"⚠️ [Agent] Error closing old exit stack for user '{uid}' (non-critical): {e}")
 
                 # Wait for async generator cleanup to complete
                 # This gives time for all async contexts to fully close
@@ -422,7 +423,7 @@ class AgentRuntime:
         uid = user_id or self.DEFAULT_USER_ID
         if uid in self._graphs:
             self._graphs[uid] = None
-        print(f"🔄 [Agent] Graph invalidated for user '{uid}' - will be rebuilt on next access")
+        logger.info(f"🔄 [Agent] Graph invalidated for user '{uid}' - will be rebuilt on next access")
 
     async def get_graph(self, user_id: Optional[str] = None) -> Any:
         uid = user_id or self.DEFAULT_USER_ID
@@ -458,7 +459,7 @@ class AgentRuntime:
             error_msg = str(e).lower()
             if "closedresourceerror" in error_msg or "closed" in error_msg:
                 # Connection was closed, rebuild graph and retry
-                print(
+                logger.warning(
                     f"⚠️ [Agent] Connection closed for tool '{name}' (user '{uid}'). Rebuilding graph..."
                 )
                 await self.rebuild_graph(user_id=uid)
@@ -6,7 +6,7 @@ from sqlalchemy.ext.asyncio import (
     AsyncEngine
 )
 from contextlib import asynccontextmanager
-from typing import AsyncGenerator
+from typing import AsyncGenerator, Optional
 import logging
 import os
 import threading
@@ -48,29 +48,41 @@ class DatabaseManager:
         DATABASE = os.getenv("POSTGRES_DB")
         self.DATABASE_URL = f"postgresql+asyncpg://{USERNAME}:{PASSWORD}@{HOST}:{PORT}/{DATABASE}"
 
-        # Create async engine
-        self.engine: AsyncEngine = create_async_engine(
-            self.DATABASE_URL,
-            pool_size=self.POOL_SIZE,
-            max_overflow=self.MAX_OVERFLOW,
-            pool_timeout=self.POOL_TIMEOUT,
-            pool_recycle=self.POOL_RECYCLE,
-            echo=self.ECHO_SQL,
-            pool_pre_ping=True,
-        )
-
-        # Create async session factory
-        self.async_session_factory = async_sessionmaker(
-            self.engine,
-            class_=AsyncSession,
-            expire_on_commit=False,
-            autoflush=False,
-            autocommit=False,
-        )
+        # Engine and session factory are created on first use (see properties below)
+        self._engine: Optional[AsyncEngine] = None
+        self._async_session_factory: Optional[async_sessionmaker[AsyncSession]] = None
 
         self._initialized = True
         logger.info("Database manager initialized")
 
+    @property
+    def engine(self) -> AsyncEngine:
+        """Async engine, created lazily so importing this module stays cheap."""
+        if self._engine is None:
+            self._engine = create_async_engine(
+                self.DATABASE_URL,
+                pool_size=self.POOL_SIZE,
+                max_overflow=self.MAX_OVERFLOW,
+                pool_timeout=self.POOL_TIMEOUT,
+                pool_recycle=self.POOL_RECYCLE,
+                echo=self.ECHO_SQL,
+                pool_pre_ping=True,
+            )
+        return self._engine
+
+    @property
+    def async_session_factory(self) -> async_sessionmaker[AsyncSession]:
+        """Async session factory bound to the lazily created engine."""
+        if self._async_session_factory is None:
+            self._async_session_factory = async_sessionmaker(
+                self.engine,
+                class_=AsyncSession,
+                expire_on_commit=False,
+                autoflush=False,
+                autocommit=False,
+            )
+        return self._async_session_factory
+
     async def init_db(self, drop_existing: bool = False) -> None:
         """
         Initialize database tables.
@@ -131,7 +143,11 @@ class DatabaseManager:
 
     async def close(self) -> None:
         """Dispose of the engine and close all connections."""
-        await self.engine.dispose()
+        if self._engine is None:
+            return
+        await self._engine.dispose()
+        self._engine = None
+        self._async_session_factory = None
         logger.info("Database connections closed")
 
     async def health_check(self) -> bool:
@@ -3,6 +3,7 @@ from __future__ import annotations
 import json
 import os
 import logging
+import re
 from typing import Iterable, Sequence, Optional
 
 from langchain_core.language_models import BaseLanguageModel
@@ -13,7 +14,7 @@ from langgraph.graph import END, MessagesState, StateGraph
 from langgraph.prebuilt import ToolNode
 
 from utils.prompt_guides import prompt_guides, get_prompt_template
-from utils.tool_response_handler import ToolResponseHandler
+from utils.tool_response_handler import ToolResponseHandler, format_json
 
 logger = logging.getLogger(__name__)
 
@@ -51,6 +52,35 @@ def _get_current_user_id() -> Optional[str]:
         logger.debug(f"Could not get user_id from Chainlit context: {e}")
     return None
 
+# Generic patterns to detect tool call attempts in plain LLM text when no tools
+# are available (works for any tool format):
+# 1. JSON with "tool" and "args" fields
+# 2. JSON-like structures with tool/function/name fields
+# 3. Function call syntax: function_name(...) - generic, works for any function name
+# 4. Code blocks with function calls: ```python function_name(...) ```
+# 5. Code-like patterns that suggest tool invocation attempts
+_TOOL_CALL_ATTEMPT_PATTERNS = (
+    re.compile(r'\{[^}]*"tool"\s*:\s*["\'][^"\']+["\'][^}]*"args"\s*:\s*\{', re.IGNORECASE | re.DOTALL),
+    re.compile(r'\{[^}]*"(?:tool|function|name)"\s*:\s*["\'][^"\']+["\']', re.IGNORECASE | re.DOTALL),
+    re.compile(r"\b\w+\s*\([^)]*\)", re.IGNORECASE),
+    re.compile(r"```\s*\w*\s*\n?\s*\w+\s*\(", re.IGNORECASE),
+    re.compile(r"(?:```|function|call|invoke|execute)\s*\w+\s*\(", re.IGNORECASE),
+)
+
+# Generic patterns that indicate execution attempts when tools ARE available (works for any agent):
+# 1. Function call syntax: function_name(...)
+_EXEC_FUNCTION_CALL_RE = re.compile(r"^\w+\s*\([^)]*\)\s*$")
+# 2. Code blocks: ```python, import statements, etc.
+_EXEC_CODE_BLOCK_RE = re.compile(
+    r"```python|```\s*\w+\s*\(|from\s+\w+\s+import|import\s+\w+", re.IGNORECASE
+)
+# 3. Command-like patterns: word followed by flags or URLs (generic, not tool-specific)
+# This catches patterns like "command -flag" or "command://url" without hardcoding specific commands
+_EXEC_COMMAND_RE = re.compile(r"\b\w+\s+(-[a-zA-Z]|--[a-zA-Z-]+|\w+://)")
+
+# JSON payload carrying formatted code inside a tool result
+_FORMATTED_CODE_JSON_RE = re.compile(r'\{.*?"formatted_code".*?\}', re.DOTALL)
+
 # Maximum number of conversation turns to keep in history
 # A turn = human message + AI response + tool calls/results
 MAX_HISTORY_TURNS = int(os.getenv("MAX_HISTORY_TURNS", "10"))
@@ -103,7 +133,7 @@ def build_graph(
             # A turn typically includes: human, ai, and possibly tool messages
             # We'll keep the last MAX_HISTORY_TURNS * 3 messages to account for tool calls
             truncated = conversation_messages[-(MAX_HISTORY_TURNS * 3) :]
-            print(
+            logger.debug(
                 f"⚠️ [Graph] Truncated message history from {len(conversation_messages)} to {len(truncated)} messages (keeping last {MAX_HISTORY_TURNS} turns)"
             )
             return system_messages + truncated
@@ -222,7 +252,7 @@ def build_graph(
                 # If it's a generation request without existing resources, use plain LLM without tools
                 # This avoids Bedrock validation issues and ensures direct response generation
                 if is_generation_request and not has_existing_resources:
-                    print(
+                    logger.debug(
                         f"⚠️ [Graph] Detected generation request without existing resources. Using plain LLM (no tools) for direct response."
                     )
                     # Use plain LLM without tools for generation requests
@@ -319,14 +349,14 @@ def build_graph(
                         filtered_history.append(ai_msg)
                     elif last_non_system.type == "ai":
                         # Consecutive AI message - skip
-                        print(
+                        logger.debug(
                             f"⚠️ [Graph] Skipping consecutive AI message to maintain role alternation"
                         )
                     elif last_non_system.type == "tool":
                         # Tool messages are part of assistant turn - cannot have another AI after
                         # This is likely a handler response - skip it but keep tool messages
                         # so LLM can see tool results and decide next step
-                        print(
+                        logger.debug(
                             f"⚠️ [Graph] Skipping AI message (handler response) after tool messages. Tool messages will be included so LLM can see results for next step."
                         )
                     elif last_non_system.type == "human":
@@ -334,7 +364,7 @@ def build_graph(
                         filtered_history.append(ai_msg)
                     else:
                         # Unknown type - skip to be safe
-                        print(
+                        logger.debug(
                             f"⚠️ [Graph] Skipping AI message after unknown message type: {last_non_system.type}"
                         )
                     i += 1
@@ -354,7 +384,7 @@ def build_graph(
                 last_msg = filtered_history[-1]
                 if hasattr(last_msg, "type") and last_msg.type == "ai":
                     if not getattr(last_msg, "tool_calls", None):
-                        print(
+                        logger.debug(
                             f"⚠️ [Graph] Removing trailing AI message without tool_calls to avoid Bedrock validation error"
                         )
                         filtered_history = filtered_history[:-1]
@@ -415,12 +445,12 @@ def build_graph(
                             cleaned_history.append(ai_msg)
                         elif last_non_system.type == "ai":
                             # Consecutive AI message - skip
-                            print(
+                            logger.debug(
                                 f"⚠️ [Graph] Skipping consecutive AI message (without tool_calls) to maintain role alternation"
                             )
                         elif last_non_system.type == "tool":
                             # Tool messages are part of assistant turn - cannot have another AI after
-                            print(
+                            logger.debug(
                                 f"⚠️ [Graph] Skipping AI message after tool messages (tool messages don't break user/assistant alternation)"
                             )
                         elif last_non_system.type == "human":
@@ -428,14 +458,14 @@ def build_graph(
                             cleaned_history.append(ai_msg)
                         else:
                             # Unknown type - skip to be safe
-                            print(
+                            logger.debug(
                                 f"⚠️ [Graph] Skipping AI message after unknown message type: {last_non_system.type}"
                             )
                         i += 1
                 elif msg.type == "tool":
                     # Tool messages should be handled above when following AI with tool_calls
                     # If we encounter an orphaned tool message, skip it
-                    print(
+                    logger.warning(
                         f"⚠️ [Graph] Skipping orphaned tool message (no preceding AI message with tool_calls)"
                     )
                     i += 1
@@ -458,7 +488,7 @@ def build_graph(
                 if getattr(first_non_system, "type", None) != "human":
                     # First non-system message is not human - this will cause Bedrock validation error
                     # Find the most recent human message and ensure it's at the start
-                    print(
+                    logger.warning(
                         f"⚠️ [Graph] First non-system message is not human (type: {getattr(first_non_system, 'type', 'unknown')}). "
                         f"Ensuring human message is first."
                     )
@@ -489,7 +519,7 @@ def build_graph(
                         filtered_history = system_msgs + [human_msg] + non_system_msgs
                     else:
                         # No human message found - this is a critical error
-                        print(
+                        logger.error(
                             f"❌ [Graph] ERROR: No human message found in filtered_history! This will cause Bedrock validation error."
                         )
                         # Try to get the original user message from state
@@ -510,33 +540,33 @@ def build_graph(
                                     filtered_history = (
                                         system_msgs + [msg] + non_system_msgs
                                     )
-                                    print(
+                                    logger.debug(
                                         f"✅ [Graph] Recovered human message from original history"
                                     )
                                     break
             else:
                 # Only system messages - need to add a human message
-                print(
+                logger.warning(
                     f"⚠️ [Graph] filtered_history contains only system messages. Looking for human message in original history."
                 )
                 if history:
                     for msg in reversed(history):
                         if getattr(msg, "type", None) == "human":
                             filtered_history.append(msg)
-                            print(
+                            logger.debug(
                                 f"✅ [Graph] Added human message from original history"
                             )
                             break
         else:
             # Empty filtered_history - this should not happen, but handle it
-            print(
+            logger.warning(
                 f"⚠️ [Graph] filtered_history is empty. Looking for human message in original history."
             )
             if history:
                 for msg in reversed(history):
                     if getattr(msg, "type", None) == "human":
                         filtered_history = [msg]
-                        print(
+                        logger.debug(
                             f"✅ [Graph] Recovered human message from original history"
                         )
                         break
@@ -548,12 +578,12 @@ def build_graph(
         human_msgs_in_prompt = [
             msg for msg in filtered_history if getattr(msg, "type", None) == "human"
         ]
-        print(
+        logger.debug(
             f"🔍 [Graph] query_or_respond: filtered_history has {len(filtered_history)} messages, "
             f"including {len(tool_msgs_in_prompt)} tool message(s), {len(human_msgs_in_prompt)} human message(s)"
         )
         if tool_msgs_in_prompt:
-            print(
+            logger.debug(
                 f"🔍 [Graph] Tool messages in prompt: {[getattr(msg, 'name', 'unknown') for msg in tool_msgs_in_prompt]}"
             )
         # When we have tool results, make it VERY clear what the next step is
@@ -590,13 +620,8 @@ def build_graph(
                 # Try to extract formatted code from tool result
                 formatted_code = ""
                 try:
-                    import json
-                    import re
-
                     # Look for JSON in tool result
-                    json_match = re.search(
-                        r'\{.*?"formatted_code".*?\}', tool_result_content, re.DOTALL
-                    )
+                    json_match = _FORMATTED_CODE_JSON_RE.search(tool_result_content)
                     if json_match:
                         tool_data = json.loads(json_match.group())
                         formatted_code = tool_data.get("formatted_code", "")
@@ -659,19 +684,19 @@ def build_graph(
                         msg for msg in non_system_msgs if msg != human_msg
                     ]
                     non_system_msgs = [human_msg] + non_system_msgs
-                    print(
+                    logger.debug(
                         f"✅ [Graph] Reordered messages to ensure human message is first"
                     )
                 else:
                     # No human message found - try to get from original history
-                    print(
+                    logger.warning(
                         f"⚠️ [Graph] No human message in filtered_history. Looking in original history..."
                     )
                     if history:
                         for msg in reversed(history):
                             if getattr(msg, "type", None) == "human":
                                 non_system_msgs = [msg] + non_system_msgs
-                                print(
+                                logger.debug(
                                     f"✅ [Graph] Added human message from original history"
                                 )
                                 break
@@ -691,7 +716,7 @@ def build_graph(
                 not hasattr(first_non_system, "type")
                 or first_non_system.type != "human"
             ):
-                print(
+                logger.error(
                     f"❌ [Graph] ERROR: First non-system message is not human! Type: {getattr(first_non_system, 'type', 'unknown')}"
                 )
                 # This will cause Bedrock validation error, but we've done our best
@@ -711,7 +736,7 @@ def build_graph(
                 tool_name = tc.get("name")
                 if tool_name not in valid_tool_names:
                     invalid_tool_calls.append(tool_name)
-                    print(
+                    logger.warning(
                         f"❌ [Graph] LLM tried to call invalid tool '{tool_name}'. Valid tools: {list(valid_tool_names)}"
                     )
                 else:
@@ -719,7 +744,7 @@ def build_graph(
 
             # If there are invalid tool calls, return a message prompting direct response
             if invalid_tool_calls:
-                print(
+                logger.warning(
                     f"⚠️ [Graph] Invalid tool calls detected: {invalid_tool_calls}. Prompting LLM to respond directly."
                 )
                 return {
@@ -732,7 +757,7 @@ def build_graph(
 
             # Only log if all tool calls are valid
             if valid_tool_calls:
-                print(
+                logger.debug(
                     f"✅ [Graph] LLM is calling {len(valid_tool_calls)} tool(s): {[tc.get('name') for tc in valid_tool_calls]}"
                 )
         else:
@@ -741,46 +766,22 @@ def build_graph(
                 if hasattr(response, "content")
                 else "No content"
             )
-            print(
+            logger.debug(
                 f"⚠️ [Graph] LLM generated text instead of tool calls. Content preview: {content_preview}"
             )
 
             # Generic check: If no tools are available and LLM generated content that looks like a tool call attempt,
             # provide a helpful error message
             if hasattr(response, "content") and not tool_list:
-                import re
-
                 content_str = str(response.content).strip()
 
-                # Generic patterns to detect tool call attempts (works for any tool format):
-                # 1. JSON with "tool" and "args" fields
-                json_tool_pattern = (
-                    r'\{[^}]*"tool"\s*:\s*["\'][^"\']+["\'][^}]*"args"\s*:\s*\{'
-                )
-                # 2. JSON-like structures with tool/function/name fields
-                json_like_pattern = (
-                    r'\{[^}]*"(?:tool|function|name)"\s*:\s*["\'][^"\']+["\']'
-                )
-                # 3. Function call syntax: function_name(...) - generic, works for any function name
-                function_call_pattern = r"\b\w+\s*\([^)]*\)"
-                # 4. Code blocks with function calls: ```python function_name(...) ```
-                code_block_with_call = r"```\s*\w*\s*\n?\s*\w+\s*\("
-                # 5. Code-like patterns that suggest tool invocation attempts
-                code_like_pattern = r"(?:```|function|call|invoke|execute)\s*\w+\s*\("
-
                 # Check if content looks like a tool call attempt (any format)
-                looks_like_tool_call = (
-                    re.search(json_tool_pattern, content_str, re.IGNORECASE | re.DOTALL)
-                    or re.search(
-                        json_like_pattern, content_str, re.IGNORECASE | re.DOTALL
-                    )
-                    or re.search(function_call_pattern, content_str, re.IGNORECASE)
-                    or re.search(code_block_with_call, content_str, re.IGNORECASE)
-                    or re.search(code_like_pattern, content_str, re.IGNORECASE)
+                looks_like_tool_call = any(
+                    pattern.search(content_str) for pattern in _TOOL_CALL_ATTEMPT_PATTERNS
                 )
 
                 if looks_like_tool_call:
-                    print(
+                    logger.warning(
                         f"⚠️ [Graph] LLM attempted to generate tool call but no tools are available. Content: {content_str[:200]}"
                     )
                     return {
@@ -800,28 +801,15 @@ def build_graph(
             # Generic check: If LLM generated text instead of tool calls, and tools are available,
             # check if the content looks like execution code/commands (not just conversational text)
             if hasattr(response, "content") and tool_list:
-                import re
-
                 content_str = str(response.content).strip()
 
-                # Generic patterns that indicate execution attempts (works for any agent):
-                # 1. Function call syntax: function_name(...)
-                function_call_pattern = r"^\w+\s*\([^)]*\)\s*$"
-                # 2. Code blocks: ```python, import statements, etc.
-                code_block_pattern = (
-                    r"```python|```\s*\w+\s*\(|from\s+\w+\s+import|import\s+\w+"
-                )
-                # 3. Command-like patterns: word followed by flags or URLs (generic, not tool-specific)
-                # This catches patterns like "command -flag" or "command://url" without hardcoding specific commands
-                execution_pattern = r"\b\w+\s+(-[a-zA-Z]|--[a-zA-Z-]+|\w+://)"
-
                 # Only filter if it looks like execution code/commands, not conversational text
                 if (
-                    re.match(function_call_pattern, content_str)
-                    or re.search(code_block_pattern, content_str, re.IGNORECASE)
-                    or re.search(execution_pattern, content_str)
+                    _EXEC_FUNCTION_CALL_RE.match(content_str)
+                    or _EXEC_CODE_BLOCK_RE.search(content_str)
+                    or _EXEC_COMMAND_RE.search(content_str)
                 ):
-                    print(
+                    logger.warning(
                         f"❌ [Graph] LLM generated code/command syntax instead of using tool calling API. Content: {content_str[:200]}. Filtering out."
                     )
                     # Return a message that prompts the LLM to use tools instead
@@ -844,7 +832,7 @@ def build_graph(
 
         # 1. Capture Tool Outputs
         tool_messages = _gather_recent_tool_messages(messages)
-        print(
+        logger.debug(
             f"🔍 [Graph] generate() called. Found {len(tool_messages)} tool message(s)"
         )
 
@@ -859,12 +847,12 @@ def build_graph(
             if extracted and extracted.strip():
                 docs_content_parts.append(extracted)
             else:
-                print(
+                logger.warning(
                     f"⚠️ [Graph] Tool message {getattr(msg, 'name', 'unknown')} extracted empty content. Raw content: {str(getattr(msg, 'content', ''))[:200]}"
                 )
 
         docs_content = "\n\n".join(docs_content_parts)
-        print(
+        logger.debug(
             f"🔍 [Graph] Found {len(tool_messages)} tool message(s). Extracted {len(docs_content_parts)} non-empty parts. docs_content length: {len(docs_content)}, preview: {docs_content[:200]}"
         )
 
@@ -873,45 +861,45 @@ def build_graph(
             tool_names = [
                 msg.name for msg in tool_messages if isinstance(msg, ToolMessage)
             ]
-            print(f"🔍 [Graph] Tool names: {tool_names}")
+            logger.debug(f"🔍 [Graph] Tool names: {tool_names}")
 
         # 3. CRITICAL: If we have tool outputs with actual content, ALWAYS show them directly
         # This prevents LLM from generating descriptions or explanations
         # We do this FIRST, before checking handler metadata, to ensure stability
         has_tool_output = tool_messages and docs_content and docs_content.strip()
-        print(
+        logger.debug(
             f"🔍 [Graph] has_tool_output: {has_tool_output} (tool_messages: {bool(tool_messages)}, docs_content exists: {bool(docs_content)}, docs_content.strip: {bool(docs_content.strip() if docs_content else False)})"
         )
 
         if has_tool_output:
-            print(
+            logger.debug(
                 f"✅ [Graph] Tool outputs detected with content. Attempting to show directly."
             )
 
             # Get current user ID for per-user metadata lookup
             current_user_id = _get_current_user_id()
-            print(f"🔍 [Graph] Current user_id: {current_user_id}")
+            logger.debug(f"🔍 [Graph] Current user_id: {current_user_id}")
 
             # Try handler first (for proper formatting if metadata is available)
-            # Force refresh metadata before checking to ensure it's up to date
-            # This ensures metadata is fresh even if servers were added via UI
+            # Refresh metadata before checking to ensure it's up to date
+            # (cheap no-op unless MCP storage changed, e.g. servers added via UI)
             handler.refresh_metadata(user_id=current_user_id)
             handler_worked = False
             for message in tool_messages:
                 if isinstance(message, ToolMessage):
                     tool_name = message.name
-                    print(f"🔍 [Graph] Processing tool: {tool_name}")
-                    print(
+                    logger.debug(f"🔍 [Graph] Processing tool: {tool_name}")
+                    logger.debug(
                         f"🔍 [Graph] Tool message content type: {type(message.content)}, preview: {str(message.content)[:200]}"
                     )
 
                     should_handle = handler.should_handle_directly(tool_name, user_id=current_user_id)
-                    print(
+                    logger.debug(
                         f"🔍 [Graph] Tool: {tool_name}, should_handle_directly: {should_handle}"
                     )
 
                     if should_handle:
-                        print(
+                        logger.debug(
                             f"🔧 [Graph] Tool {tool_name} should be handled directly. Using handler."
                         )
                         response = handler.handle_tool_response(message, user_id=current_user_id)
@@ -920,7 +908,7 @@ def build_graph(
                             and response.content
                             and str(response.content).strip()
                         ):
-                            print(
+                            logger.debug(
                                 f"✅ [Graph] Handler returned response for {tool_name}: {str(response.content)[:200]}"
                             )
                             handler_worked = True
@@ -929,18 +917,16 @@ def build_graph(
             # If handler didn't work (metadata missing, handler failed, or tool has no direct mode),
             # show raw output directly - this is ALWAYS better than letting LLM generate descriptions
             if not handler_worked:
-                print(
+                logger.debug(
                     f"⚠️ [Graph] Handler didn't intercept. Showing tool output directly to prevent LLM descriptions."
                 )
                 # Try to format JSON nicely if the content is JSON
                 formatted_content = docs_content
                 try:
-                    import json
-
                     # Try to parse as JSON and pretty-print it
                     parsed = json.loads(docs_content)
-                    formatted_content = json.dumps(parsed, indent=2)
-                    print(f"✅ [Graph] Formatted tool output as JSON")
+                    formatted_content = format_json(parsed)
+                    logger.debug(f"✅ [Graph] Formatted tool output as JSON")
                 except (json.JSONDecodeError, ValueError):
                     # Not JSON, use as-is
                     pass
@@ -949,7 +935,7 @@ def build_graph(
         # If no tool outputs, let LLM respond normally
         # But if we somehow reach here with tool outputs (shouldn't happen, but safety check)
         if tool_messages and docs_content and docs_content.strip():
-            print(
+            logger.warning(
                 f"⚠️ [Graph] WARNING: Reached LLM processing with tool outputs! This shouldn't happen. Showing tool output directly instead."
             )
             return {"messages": [AIMessage(content=docs_content)]}
@@ -975,7 +961,7 @@ def build_graph(
         else:
             system_message_content = prompt_template
 
-        print(f"\n🧠 [Graph] System Prompt:\n{system_message_content}\n")
+        logger.debug(f"\n🧠 [Graph] System Prompt:\n{system_message_content}\n")
 
         # Filter messages to ensure proper role alternation and avoid consecutive assistant messages
         conversation_messages = []
@@ -1065,8 +1051,6 @@ def build_graph(
             # Generic multi-step detection: look for multiple distinct action verbs/requests
             # This works for any tools, not just specific ones
             if not is_multi_step:
-                import re
-
                 # Common action verbs that indicate tool usage (generic list)
                 # These are domain-agnostic and work for any type of agent/tool
                 action_verbs = [
@@ -1099,7 +1083,7 @@ def build_graph(
                 # If we found 2+ distinct action verbs, it's likely multi-step
                 if len(found_actions) >= 2:
                     is_multi_step = True
-                    print(
+                    logger.debug(
                         f"🔍 [Graph] Detected multi-step query based on multiple action verbs: {list(found_actions)}"
                     )
 
@@ -1143,12 +1127,12 @@ def build_graph(
 
                     if action_sentences >= 2:
                         is_multi_step = True
-                        print(
+                        logger.debug(
                             f"🔍 [Graph] Detected multi-step query based on multiple action sentences: {action_sentences} sentences"
                         )
 
             if not is_multi_step:
-                print(f"✅ [Graph] Single-step request complete, routing to END")
+                logger.debug(f"✅ [Graph] Single-step request complete, routing to END")
                 return END
 
             # For multi-step requests, check if all steps are likely complete
@@ -1162,8 +1146,6 @@ def build_graph(
                             tool_calls_count += len(msg.tool_calls)
 
             # Count steps in user request (generic heuristic)
-            import re
-
             step_count = 1  # At least one step
             # Count numbered steps (1., 2., etc.)
             numbered_steps = len(re.findall(r"\d+\.", original_request))
@@ -1204,7 +1186,7 @@ def build_graph(
 
                     if len(found_actions) >= 2:
                         step_count = len(found_actions)
-                        print(
+                        logger.debug(
                             f"🔍 [Graph] Detected {step_count} steps based on action verbs: {list(found_actions)}"
                         )
                     else:
@@ -1224,22 +1206,22 @@ def build_graph(
 
                         if action_sentences >= 2:
                             step_count = action_sentences
-                            print(
+                            logger.debug(
                                 f"🔍 [Graph] Detected {step_count} steps based on action sentences"
                             )
 
-            print(
+            logger.debug(
                 f"🔍 [Graph] Multi-step request: {step_count} steps detected, {tool_calls_count} tool calls executed"
             )
 
             # If we've executed at least as many tools as steps, likely complete
             if tool_calls_count >= step_count:
-                print(
+                logger.debug(
                     f"✅ [Graph] All steps appear complete ({tool_calls_count} tools >= {step_count} steps), routing to END"
                 )
                 return END
             else:
-                print(
+                logger.debug(
                     f"🔄 [Graph] More steps remaining ({tool_calls_count} < {step_count}), routing back to query_or_respond"
                 )
                 return "query_or_respond"
@@ -1291,9 +1273,7 @@ def _stringify_tool_message(message) -> str:
 
     # For dict or other types, convert to JSON string
     if isinstance(content, (dict, list)):
-        import json
-
-        return json.dumps(content, indent=2)
+        return format_json(content)
 
     return str(content)
 
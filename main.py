@@ -1,4 +1,3 @@
-import json
 import logging
 import os
 import sys
@@ -6,34 +5,62 @@ import uuid
 import asyncio
 import time
 import re
-from typing import Dict, Optional, cast
+from collections import deque
+from contextlib import aclosing
+from contextvars import ContextVar
+from functools import lru_cache
+from itertools import islice
+from typing import Any, AsyncIterator, Dict, Optional, cast
 from pathlib import Path
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
 from mcp import ClientSession
 
 import chainlit as cl
 from chainlit.data.sql_alchemy import SQLAlchemyDataLayer
 from chainlit.types import ThreadDict
+from starlette.responses import Response
 from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
 from langchain_core.runnables import RunnableConfig
+import orjson
 
 from agent import agent_runtime
 from database import DatabaseManager
-from utils import create_chat_settings
+from utils import create_chat_settings, socketio_json
 from utils.prompt_guides import refresh_prompt_guides
+from utils.tool_response_handler import _tool_response_handler
 from utils.mcp_storage import (
-    add_mcp_server,
+    upsert_mcp_server,
     remove_mcp_server,
-    get_mcp_server,
     clear_all,
     get_mcp_servers,
-    is_server_removed,
-    get_removal_cooldown_remaining,
+    get_removal_state,
+    set_live_session,
+    clear_removed_servers,
+    get_all_user_ids,
+    get_user_count,
 )
 from exceptions import (
     GraphBuildError,
     GraphExecutionError,
 )
 
+# Redis log streaming is optional; without it job progress falls back to polling
+try:
+    from wizelit_sdk.agent_wrapper.streaming import LogStreamer
+
+    HAS_REDIS_STREAMING = True
+except ImportError:
+    LogStreamer = None
+    HAS_REDIS_STREAMING = False
+
+
+# Serialize Socket.IO packets (messages, steps, elements) with orjson
+socketio_json.install()
+
+
+# Per-task cache of the resolved user id, tagged with the session it was resolved for
+_USER_ID_CV: ContextVar[Optional[tuple[Any, str]]] = ContextVar("_wizelit_user_id", default=None)
+
 
 def _get_user_id() -> str:
     """
@@ -51,36 +78,42 @@ def _get_user_id() -> str:
     """
     user_id = None
     source = None
+    session = None
 
     try:
-        if hasattr(cl, 'context') and cl.context and hasattr(cl.context, 'session'):
-            session = cl.context.session
-
-            # First priority: authenticated user identifier (OAuth email/ID)
-            if hasattr(session, 'user') and session.user:
-                user = session.user
-                # Try identifier (usually email from OAuth)
-                if hasattr(user, 'identifier') and user.identifier:
-                    user_id = user.identifier
-                    source = "user.identifier"
-                # Try internal user ID
-                elif hasattr(user, 'id') and user.id:
-                    user_id = user.id
-                    source = "user.id"
-
-            # Second priority: WebSocket client ID (unique per browser connection)
-            # This is more reliable than session.id for distinguishing browsers
-            if not user_id:
-                if hasattr(session, 'client_id') and session.client_id:
-                    user_id = session.client_id
-                    source = "client_id"
-                elif hasattr(session, 'id') and session.id:
-                    # session.id as fallback (but may not be unique per user!)
-                    user_id = session.id
-                    source = "session.id"
+        session = getattr(cl.context, "session", None)
     except Exception as e:
         logger.warning(f"⚠️ [Auth] Error getting user_id from context: {e}")
 
+    if session is not None:
+        # Resolved once per session within this task (and tasks spawned from it)
+        cached = _USER_ID_CV.get()
+        if cached is not None and cached[0] is session:
+            return cached[1]
+
+        # First priority: authenticated user identifier (OAuth email/ID)
+        user = getattr(session, "user", None)
+        if user:
+            # Try identifier (usually email from OAuth)
+            if getattr(user, "identifier", None):
+                user_id = user.identifier
+                source = "user.identifier"
+            # Try internal user ID
+            elif getattr(user, "id", None):
+                user_id = user.id
+                source = "user.id"
+
+        # Second priority: WebSocket client ID (unique per browser connection)
+        # This is more reliable than session.id for distinguishing browsers
+        if not user_id:
+            if getattr(session, "client_id", None):
+                user_id = session.client_id
+                source = "client_id"
+            elif getattr(session, "id", None):
+                # session.id as fallback (but may not be unique per user!)
+                user_id = session.id
+                source = "session.id"
+
     # Fallback: try to get from user_session (set in on_chat_start)
     if not user_id:
         try:
@@ -97,16 +130,23 @@ def _get_user_id() -> str:
         source = "generated_uuid"
         logger.warning(f"⚠️ [Auth] Generated anonymous user_id: {user_id} - this may cause isolation issues!")
 
+    if session is not None and source != "generated_uuid":
+        _USER_ID_CV.set((session, user_id))
+
     # Log for debugging multi-user issues
     logger.debug(f"🔑 [Auth] User ID: {user_id} (source: {source})")
     return user_id
 
 
 # Health check endpoint for ALB/ECS
+# Static health payload, encoded once
+_HEALTH_BODY = b'{"status":"healthy","service":"wizelit"}'
+
+
 @cl.server.app.get("/health")
 async def health_check():
     """Health check endpoint for load balancer and container orchestration."""
-    return {"status": "healthy", "service": "wizelit"}
+    return Response(content=_HEALTH_BODY, media_type="application/json")
 
 
 db_manager = DatabaseManager()
@@ -117,7 +157,117 @@ PROJECT_ROOT = Path(__file__).parent
 if str(PROJECT_ROOT) not in sys.path:
     sys.path.insert(0, str(PROJECT_ROOT))
 
-TASK_TIMEOUT = os.getenv("TASK_TIMEOUT", 1200)  # Default to 20 minutes
+TASK_TIMEOUT = float(os.getenv("TASK_TIMEOUT", "1200"))  # Default to 20 minutes
+
+# Log streaming settings (resolved once at import; env does not change at runtime)
+ENABLE_LOG_STREAMING = os.getenv("ENABLE_LOG_STREAMING", "true").lower() == "true"
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379")
+LOG_STREAM_TIMEOUT = float(os.getenv("LOG_STREAM_TIMEOUT_SECONDS", "300"))
+JOB_LOG_TAIL = int(os.getenv("JOB_LOG_TAIL", "25"))  # Log lines shown in the job step
+# The shared Redis connection idles between jobs; periodic health checks let dead
+# connections (NAT/LB timeouts) be detected instead of hanging (the SDK already
+# enables TCP keepalive)
+REDIS_HEALTH_CHECK_INTERVAL = int(os.getenv("REDIS_HEALTH_CHECK_INTERVAL", "15"))
+
+# Send multiple handler responses of one turn as a single message (separated by rules)
+COALESCE_RESPONSES = os.getenv("WIZELIT_COALESCE_RESPONSES", "false").lower() == "true"
+
+# Log events arriving within this window are batched into a single step update
+LOG_COALESCE_MAX_EVENTS = 32
+LOG_COALESCE_WINDOW_SECONDS = 0.05
+# ...and the job step is redrawn at most this often (status changes always flush)
+LOG_UI_MIN_UPDATE_INTERVAL_SECONDS = 0.2
+
+# Polling fallback: back off between get_job_status calls while a job is quiet.
+# Start short so quick jobs are picked up promptly; the backoff caps the call rate.
+POLL_INTERVAL_INITIAL_SECONDS = 0.2
+POLL_INTERVAL_MAX_SECONDS = 10.0
+POLL_BACKOFF_FACTOR = 1.5
+# Upper bound for a single get_job_status call
+POLL_CALL_TIMEOUT_SECONDS = 10.0
+
+# Function-call syntax the LLM sometimes emits as plain text instead of using tools.
+# Matching the "name(...)" prefix covers the exact call, the call followed by output
+# and the call at the start of the text.
+_FN_CALL_COMBINED = re.compile(r"^\s*\w+\s*\([^)]*\)")
+
+
+def _starts_with_function_call(text: str) -> bool:
+    """True if stripped text starts with "name(...)"; cheap checks reject prose first."""
+    first = text[:1]
+    if not (first.isalnum() or first == "_") or "(" not in text:
+        return False
+    return _FN_CALL_COMBINED.match(text) is not None
+
+
+# Marker returned by tools that dispatched a long-running job
+_JOB_ID_RE = re.compile(r"JOB_ID:\s*(JOB-[\w-]+)")
+
+# Whitespace removed from MCP server names to build storage keys
+_WS_TABLE = str.maketrans("", "", " \t\n")
+
+
+@lru_cache(maxsize=256)
+def _canonical_server_key(name: str) -> str:
+    """Storage key for an MCP server name (whitespace stripped, interned)."""
+    return sys.intern(name.translate(_WS_TABLE))
+
+
+# Connection attributes kept in MCP storage (read by agent.py when building the graph)
+_MCP_STORED_FIELDS = ("name", "url")
+
+# The final response of a turn sits at the tail of the thread; don't walk the whole history
+_EXTRACT_RESPONSE_SCAN_LIMIT = 8
+
+# Graph rebuilds after MCP connect/disconnect are debounced per user: every new
+# event restarts the quiet period, so a reconnect burst results in one rebuild
+GRAPH_REBUILD_DEBOUNCE_SECONDS = 0.5
+_rebuild_tasks: Dict[str, asyncio.Task] = {}
+# Rebuild tasks still waiting out the debounce window (safe to cancel)
+_rebuild_debouncing: set[asyncio.Task] = set()
+# Users whose storage changed while their rebuild was already running
+_rebuild_pending: set[str] = set()
+
+# Shared log streamer, created on first job so all jobs reuse its Redis connection
+_log_streamer = None
+
+
+def _redis_url_with_health_check(url: str) -> str:
+    """Add the health_check_interval query option to a Redis URL unless disabled or already set."""
+    if REDIS_HEALTH_CHECK_INTERVAL <= 0:
+        return url
+    parts = urlsplit(url)
+    query = dict(parse_qsl(parts.query))
+    query.setdefault("health_check_interval", str(REDIS_HEALTH_CHECK_INTERVAL))
+    return urlunsplit(parts._replace(query=urlencode(query)))
+
+
+def _get_log_streamer():
+    """
+    Return the process-wide LogStreamer, or None if streaming is disabled/unavailable.
+
+    Raises ImportError when the redis client is missing (the SDK module imports
+    without it, only the constructor fails); streaming is then disabled for
+    later jobs as well.
+    """
+    global _log_streamer, HAS_REDIS_STREAMING
+    if _log_streamer is None and ENABLE_LOG_STREAMING and HAS_REDIS_STREAMING:
+        try:
+            # redis-py reads connection options from the URL query string
+            _log_streamer = LogStreamer(_redis_url_with_health_check(REDIS_URL))
+        except ImportError:
+            HAS_REDIS_STREAMING = False
+            raise
+        # Host and port only: REDIS_URL may carry credentials
+        redis_addr = urlsplit(REDIS_URL)
+        logger.info(f"✅ [Main] Log streamer ready ({redis_addr.hostname}:{redis_addr.port or 6379})")
+    return _log_streamer
+
+
+@lru_cache(maxsize=1)
+def _chat_settings() -> cl.ChatSettings:
+    """Chat settings panel; the widgets are static per deployment, so build them once."""
+    return create_chat_settings()
 
 
 @cl.on_app_startup
@@ -137,18 +287,18 @@ async def on_startup():
     # Clear any in-memory removal blacklist (in case of hot reload)
     # NOTE: The blacklist is now in-memory only (no file persistence)
     # Chainlit's browser-stored MCP configs are the source of truth
-    from utils.mcp_storage import clear_removed_servers
     clear_removed_servers()
     logger.info(
         "🧹 [Main] Ready for MCP connections - Chainlit UI is source of truth"
     )
 
     # Refresh handler metadata on startup
-    from utils.tool_response_handler import _tool_response_handler
-
     _tool_response_handler.refresh_metadata()
     logger.info("✅ [Main] Handler metadata refreshed on startup")
 
+    if ENABLE_LOG_STREAMING and not HAS_REDIS_STREAMING:
+        logger.warning("Redis not available, job logs will use polling")
+
     # Don't call ensure_ready() here - let Chainlit auto-reconnect first via on_mcp_connect
     # This ensures we only load servers that Chainlit successfully reconnects to
     # The graph will be built when the first query comes in (via get_graph())
@@ -157,9 +307,22 @@ async def on_startup():
     )
 
 
+@cl.on_app_shutdown
+async def on_shutdown():
+    # Let in-flight graph rebuilds finish rather than dropping them mid-way
+    pending_rebuilds = [task for task in _rebuild_tasks.values() if not task.done()]
+    if pending_rebuilds:
+        logger.info(f"⏳ [Main] Waiting for {len(pending_rebuilds)} graph rebuild(s) before shutdown")
+        await asyncio.gather(*pending_rebuilds, return_exceptions=True)
+
+    if _log_streamer is not None:
+        await _log_streamer.close()
+        logger.info("✅ [Main] Log streamer closed")
+
+
 @cl.on_mcp_connect
 async def on_mcp(connection, session: ClientSession):
-    server_key = connection.name.replace(" ", "")
+    server_key = _canonical_server_key(connection.name)
     user_id = _get_user_id()
 
     # Enhanced logging to debug multi-user issues
@@ -180,8 +343,8 @@ async def on_mcp(connection, session: ClientSession):
 
     # Check if this server was recently removed for THIS USER (in cooldown period)
     # The cooldown prevents Chainlit auto-reconnect from immediately re-adding removed servers
-    if is_server_removed(server_key, user_id=user_id):
-        remaining = get_removal_cooldown_remaining(server_key, user_id=user_id)
+    remaining = get_removal_state(server_key, user_id=user_id)
+    if remaining is not None:
         logger.warning(
             f"🚫 [Main] Rejecting reconnect to '{connection.name}' for user '{user_id}' - server is in removal cooldown ({remaining:.0f}s remaining)"
         )
@@ -193,124 +356,129 @@ async def on_mcp(connection, session: ClientSession):
     result = await session.list_tools()
 
     # Process tool metadata
-    tools = []
-    for t in result.tools:
-        tool_dict = {
-            "name": t.name,
-            "description": t.description,
-            "input_schema": t.inputSchema,
-            "output_schema": t.outputSchema,
-            "meta": t.meta,
-            "title": t.title,
-        }
-
-        # Extract response_handling from MCP tool meta (from agent code via MCP protocol)
-        if t.meta and isinstance(t.meta, dict):
-            if "wizelit_response_handling" in t.meta:
-                tool_dict["response_handling"] = t.meta["wizelit_response_handling"]
-                logger.info(
-                    f"✅ [Main] Found response_handling for {t.name}: {t.meta['wizelit_response_handling']}"
-                )
-            else:
-                logger.debug(
-                    f"⚠️ [Main] No response_handling in meta for {t.name}. Meta keys: {list(t.meta.keys())}"
-                )
-
-        tools.append(tool_dict)
+    tools = [_build_tool_dict(t) for t in result.tools]
 
     # Store server metadata in memory (per-user)
-    new_connection = connection.__dict__.copy()
+    # Only keep the connection fields read downstream rather than a copy of
+    # everything on the Chainlit connection object
+    new_connection = {field: getattr(connection, field, None) for field in _MCP_STORED_FIELDS}
     new_connection["tools"] = tools
-    # CRITICAL: For stdio-based servers (like Code Formatter), store the Chainlit session
-    # so agent.py can reuse it instead of trying to reconnect
-    new_connection["chainlit_session"] = session
+    # CRITICAL: For stdio-based servers (like Code Formatter), register the Chainlit session
+    # so agent.py can reuse it instead of trying to reconnect. It is kept out of the
+    # metadata dict and only weakly referenced, so it goes away with the connection
+    set_live_session(server_key, session, user_id=user_id)
 
-    # Check if server already exists for this user (to avoid overwriting on Chainlit auto-reconnect)
-    existing_server = get_mcp_server(server_key, user_id=user_id)
-    if existing_server:
+    # Store, noting whether the server already existed (e.g. Chainlit auto-reconnect)
+    if upsert_mcp_server(server_key, new_connection, user_id=user_id):
         logger.info(
-            f"ℹ️ [Main] MCP server '{connection.name}' already in storage for user '{user_id}', updating"
+            f"ℹ️ [Main] MCP server '{connection.name}' already in storage for user '{user_id}', updated"
         )
-
-    add_mcp_server(server_key, new_connection, user_id=user_id)
     logger.info(f"✅ [Main] Stored MCP server '{connection.name}' for user '{user_id}'")
-    refresh_prompt_guides()
-    # Refresh tool response handler metadata for this user
-    from utils.tool_response_handler import _tool_response_handler
-
-    _tool_response_handler.refresh_metadata(user_id=user_id)
-
     # CRITICAL: Rebuild the graph so it includes the newly added tools
     # The graph is cached and won't automatically pick up new tools
-    # Add a small delay to let Chainlit finish its session setup before rebuilding
-    logger.info(
-        f"🔄 [Main] Scheduling graph rebuild to include new tools from '{connection.name}'..."
-    )
+    # The rebuild is debounced so Chainlit can finish its session setup and so
+    # auto-reconnect bursts collapse into a single rebuild
+    _schedule_rebuild(user_id, reason=f"new tools from '{connection.name}'")
 
-    # Use asyncio.create_task to run rebuild in background after a short delay
-    # This allows Chainlit to complete its session setup without blocking
-    # Capture user_id for the closure
-    rebuild_user_id = user_id
 
-    async def delayed_rebuild():
-        try:
-            # Wait a bit to let Chainlit finish its session operations
-            await asyncio.sleep(0.5)
-            await agent_runtime.rebuild_graph(user_id=rebuild_user_id)
-            logger.info(f"✅ [Main] Graph rebuilt for '{connection.name}' (user '{rebuild_user_id}').")
-        except GraphBuildError as rebuild_error:
-            logger.error(f"❌ [Main] Failed to rebuild graph for '{connection.name}': {rebuild_error}")
-        except Exception as rebuild_error:
-            logger.error(f"❌ [Main] Unexpected error rebuilding graph: {rebuild_error}")
+def _build_tool_dict(tool) -> Dict[str, Any]:
+    """Convert an MCP tool definition into the metadata dict kept in storage."""
+    meta = tool.meta if tool.meta and isinstance(tool.meta, dict) else {}
+    # Extract response_handling from MCP tool meta (from agent code via MCP protocol)
+    has_handling = "wizelit_response_handling" in meta
+    if has_handling:
+        logger.info(
+            "✅ [Main] Found response_handling for %s: %s", tool.name, meta["wizelit_response_handling"]
+        )
+    elif meta:
+        logger.debug(
+            "⚠️ [Main] No response_handling in meta for %s. Meta keys: %s", tool.name, list(meta)
+        )
 
-    # Store task reference to prevent garbage collection
-    task = asyncio.create_task(delayed_rebuild())
-    # Don't await - let it run in background
+    return {
+        "name": tool.name,
+        "description": tool.description,
+        "input_schema": tool.inputSchema,
+        "output_schema": tool.outputSchema,
+        "meta": tool.meta,
+        "title": tool.title,
+        **({"response_handling": meta["wizelit_response_handling"]} if has_handling else {}),
+    }
 
 
 @cl.on_mcp_disconnect
 async def on_mcp_disconnect(name: str, session: ClientSession):
     """Called when an MCP connection is terminated"""
-    no_spaces_name = name.replace(" ", "")
+    server_key = _canonical_server_key(name)
     user_id = _get_user_id()
 
     logger.info(f"🔌 [Main] MCP disconnect: server='{name}', user='{user_id}'")
 
     # Remove the disconnected server from in-memory storage (for this user only)
-    remove_mcp_server(no_spaces_name, user_id=user_id)
+    remove_mcp_server(server_key, user_id=user_id)
     logger.info(f"🗑️ [Main] Removed MCP server '{name}' for user '{user_id}'")
 
     # CRITICAL: Immediately invalidate the graph for THIS USER so it will be rebuilt on next access
     agent_runtime.invalidate_graph(user_id=user_id)
     logger.info(f"🔄 [Main] Graph invalidated for user '{user_id}' after disconnecting '{name}'")
 
-    refresh_prompt_guides()
-    # Refresh tool response handler metadata for this user
-    from utils.tool_response_handler import _tool_response_handler
-
-    _tool_response_handler.refresh_metadata(user_id=user_id)
-
     # CRITICAL: Rebuild the graph after removing tools
     # Run rebuild in background to avoid blocking
-    logger.info(f"🔄 [Main] Scheduling graph rebuild for user '{user_id}' after removing '{name}'...")
+    _schedule_rebuild(user_id, reason=f"removed '{name}'")
 
-    # Capture user_id for the closure
-    rebuild_user_id = user_id
 
-    async def delayed_rebuild():
-        try:
-            # Wait a bit to let any cleanup operations complete
-            await asyncio.sleep(0.5)
-            await agent_runtime.rebuild_graph(user_id=rebuild_user_id)
-            logger.info(f"✅ [Main] Graph rebuilt for user '{rebuild_user_id}' after disconnecting '{name}'.")
-        except GraphBuildError as rebuild_error:
-            logger.error(f"❌ [Main] Failed to rebuild graph after disconnect: {rebuild_error}")
-        except Exception as rebuild_error:
-            logger.error(f"❌ [Main] Unexpected error rebuilding graph: {rebuild_error}")
+def _schedule_rebuild(user_id: str, reason: str) -> None:
+    """
+    Request a prompt/metadata refresh and graph rebuild for a user.
 
-    # Store task reference to prevent garbage collection
-    task = asyncio.create_task(delayed_rebuild())
-    # Don't await - let it run in background
+    A request arriving during the debounce window restarts it; one arriving while
+    the rebuild is running queues a single follow-up rebuild. Either way, N MCP
+    connect/disconnect events in a burst trigger one rebuild.
+    """
+    logger.info(f"🔄 [Main] Scheduling graph rebuild for user '{user_id}' ({reason})...")
+
+    task = _rebuild_tasks.get(user_id)
+    if task is not None and not task.done():
+        if task not in _rebuild_debouncing:
+            # Never cancel a rebuild midway; run again once it finishes
+            _rebuild_pending.add(user_id)
+            return
+        task.cancel()
+
+    # Keep a reference to the task to prevent garbage collection
+    _rebuild_tasks[user_id] = asyncio.create_task(_rebuild_worker(user_id))
+
+
+async def _rebuild_worker(user_id: str) -> None:
+    """Wait for MCP events to settle, then refresh and rebuild the user's graph."""
+    task = asyncio.current_task()
+    try:
+        while True:
+            # Let Chainlit finish its session operations; cancelled if another event arrives
+            _rebuild_debouncing.add(task)
+            try:
+                await asyncio.sleep(GRAPH_REBUILD_DEBOUNCE_SECONDS)
+            finally:
+                _rebuild_debouncing.discard(task)
+            _rebuild_pending.discard(user_id)
+
+            refresh_prompt_guides()
+            # Refresh tool response handler metadata for this user
+            _tool_response_handler.refresh_metadata(user_id=user_id)
+            try:
+                await agent_runtime.rebuild_graph(user_id=user_id)
+                logger.info(f"✅ [Main] Graph rebuilt for user '{user_id}'.")
+            except GraphBuildError as rebuild_error:
+                logger.error(f"❌ [Main] Failed to rebuild graph for user '{user_id}': {rebuild_error}")
+            except Exception as rebuild_error:
+                logger.error(f"❌ [Main] Unexpected error rebuilding graph: {rebuild_error}")
+
+            if user_id not in _rebuild_pending:
+                break
+    finally:
+        # A cancelled worker may already have been replaced by a newer one
+        if _rebuild_tasks.get(user_id) is task:
+            del _rebuild_tasks[user_id]
 
 
 @cl.on_chat_start
@@ -318,14 +486,15 @@ async def on_chat_start():
     session_id = str(uuid.uuid4())
     cl.user_session.set("session_id", session_id)
 
-    # Store user_id in session for consistent access
+    # Store user_id in session for consistent access (resolved fresh for a new chat)
+    _USER_ID_CV.set(None)
     user_id = _get_user_id()
     cl.user_session.set("user_id", user_id)
 
     # Log detailed info for debugging multi-user isolation
     logger.info(f"🆕 [Main] New chat started for user '{user_id}' (session: {session_id[:8]}...)")
 
-    await create_chat_settings().send()
+    await _chat_settings().send()
 
     # Show MCP status (with small delay to let auto-reconnects complete)
     await asyncio.sleep(1.0)
@@ -334,7 +503,6 @@ async def on_chat_start():
     mcp_servers = get_mcp_servers(user_id=user_id)
 
     # Log storage state for debugging multi-user issues
-    from utils.mcp_storage import get_all_user_ids, get_user_count
     total_users = get_user_count()
     all_users = get_all_user_ids()
     logger.info(f"📊 [Main] Storage state: {total_users} user(s) with MCP servers: {all_users}")
@@ -376,7 +544,8 @@ async def main(message: cl.Message):
         # 1. Call the Agent
         # Get the current message count before invoking to track what's new
         try:
-            # Get current state to see message count before this invocation
+            # Read it from the checkpoint every turn: graph rebuilds (MCP connect/disconnect)
+            # start a fresh checkpointer, so a count kept elsewhere would drift
             current_state = await graph.aget_state(config)
             messages_before = len(current_state.values.get("messages", [])) if current_state.values else 0
             logger.debug(f"📊 [Main] Messages before invocation: {messages_before}")
@@ -386,7 +555,8 @@ async def main(message: cl.Message):
                 config=config,
             )
 
-            messages_after = len(result.get("messages", []))
+            result_messages = result.get("messages", [])
+            messages_after = len(result_messages)
             logger.debug(f"📊 [Main] Messages after invocation: {messages_after} (added {messages_after - messages_before} messages)")
         except GraphBuildError as graph_error:
             logger.error(f"Graph build failed: {graph_error}")
@@ -424,152 +594,185 @@ async def main(message: cl.Message):
                 raise
 
         # Extract all handler responses (AI messages without tool_calls) for multi-step workflows
-        # Only extract responses from the current execution (after the most recent human message)
-        all_responses = _extract_all_responses(result.get("messages", []), only_recent=True)
-        logger.info(f"📋 [Main] Extracted {len(all_responses)} handler response(s) from {len(result.get('messages', []))} total messages")
+        # Only extract responses from the current execution, i.e. after the human message we just sent
+        all_responses = _extract_all_responses(
+            result_messages, start_idx=_current_turn_start(result_messages)
+        )
+        logger.info(f"📋 [Main] Extracted {len(all_responses)} handler response(s) from {len(result_messages)} total messages")
 
-        # Separate job responses from regular responses
+        # Classify responses in one pass: regular responses become messages right away
+        # (created in display order), job responses keep their JOB_ID match for below
         job_responses = []
-        regular_responses = []
-
+        regular_messages = []
         for response_text in all_responses:
-            if not response_text or not response_text.strip():
+            if not response_text or response_text.isspace():
                 continue
 
-            # Check for Job ID in each response
-            job_match = re.search(r"JOB_ID:\s*(JOB-[\w-]+)", response_text)
+            # Substring test first: most responses carry no job marker at all
+            job_match = _JOB_ID_RE.search(response_text) if "JOB_ID:" in response_text else None
             if job_match:
-                job_responses.append(response_text)
+                job_responses.append((job_match, response_text))
             else:
-                regular_responses.append(response_text)
+                logger.info(f"📤 [Main] Sending regular handler response: {response_text[:100]}...")
+                regular_messages.append(cl.Message(content=response_text))
 
-        # Send all regular (non-job) responses first
-        for idx, response_text in enumerate(regular_responses, 1):
-            logger.info(f"📤 [Main] Sending regular handler response {idx}/{len(regular_responses)}: {response_text[:100]}...")
-            await cl.Message(content=response_text).send()
+        # Send all regular (non-job) responses first, in order (each send persists before emitting)
+        if COALESCE_RESPONSES and len(regular_messages) > 1:
+            joined = "\n\n---\n\n".join(msg.content for msg in regular_messages)
+            await cl.Message(content=joined).send()
+        else:
+            for msg in regular_messages:
+                await msg.send()
 
         # Then handle job responses (these are long-running and will return early)
-        for idx, response_text in enumerate(job_responses, 1):
+        for idx, (job_match, response_text) in enumerate(job_responses, 1):
             logger.info(f"📤 [Main] Handling job response {idx}/{len(job_responses)}: {response_text[:100]}...")
-            job_match = re.search(r"JOB_ID:\s*(JOB-[\w-]+)", response_text)
 
-            if job_match:
-                job_id = job_match.group(1)
-                await cl.Message(
-                    content=f"👨‍✈️ **Captain:** Dispatching Crew... (ID: `{job_id}`)"
-                ).send()
+            job_id = job_match.group(1)
+            await cl.Message(
+                content=f"👨‍✈️ **Captain:** Dispatching Crew... (ID: `{job_id}`)"
+            ).send()
 
-                async with cl.Step(name="Refactoring Crew", type="run") as step:
-                    step.input = "Initializing Agent Swarm..."
-                    await step.update()
+            async with cl.Step(name="Refactoring Crew", type="run") as step:
+                step.input = "Initializing Agent Swarm..."
+                await step.update()
 
-                    # Check if streaming is enabled
-                    enable_streaming = (
-                        os.getenv("ENABLE_LOG_STREAMING", "true").lower() == "true"
-                    )
+                # Check if streaming is enabled (and the SDK streamer is importable)
+                enable_streaming = ENABLE_LOG_STREAMING and HAS_REDIS_STREAMING
 
-                    if enable_streaming:
-                        # Real-time streaming via Redis
-                        try:
-                            from wizelit_sdk.agent_wrapper.streaming import LogStreamer
-
-                            redis_url = os.getenv("REDIS_URL", "redis://localhost:6379")
-                            log_streamer = LogStreamer(redis_url)
-
-                            accumulated_logs = []
-                            timeout = float(os.getenv("LOG_STREAM_TIMEOUT_SECONDS", "300"))
-
-                            try:
-                                async for log_event in log_streamer.subscribe_logs(
-                                    job_id, timeout=timeout
-                                ):
-                                    # Handle log messages
-                                    if "message" in log_event:
-                                        ts = log_event.get("timestamp", "")[:8]  # HH:MM:SS
-                                        level = log_event.get("level", "INFO")
-                                        msg = log_event.get("message", "")
-                                        formatted = f"[{level}] [{ts}] {msg}"
-                                        accumulated_logs.append(formatted)
-
-                                        # Update UI with latest logs
-                                        step.output = "\n".join(
-                                            accumulated_logs[-25:]
-                                        )  # Show last 25 lines
-                                        await step.update()
-
-                                    # Handle status changes
-                                    if "status" in log_event:
-                                        status = log_event["status"]
-
-                                        if status == "completed":
-                                            tool_result = log_event.get("result")
-                                            # Delegate handling to helper function; if it returns True, we should return from main.
-                                            if await _handle_tool_result(tool_result):
-                                                return
+                if enable_streaming:
+                    # Real-time streaming via Redis
+                    try:
+                        log_streamer = _get_log_streamer()
 
-                                        elif status == "failed":
-                                            error = log_event.get("error", "Unknown error")
-                                            await cl.Message(
-                                                content=f"❌ **Job Failed:** {error}"
-                                            ).send()
-                                            return
-
-                            except asyncio.TimeoutError:
-                                await cl.Message(
-                                    content="⏱️ Job is still running. Check back later."
-                                ).send()
+                        # Bounded buffer of raw (level, ts, msg) tuples: only the
+                        # tail shown in the UI is kept
+                        accumulated_logs = deque(maxlen=JOB_LOG_TAIL)
+
+                        logs_dirty = False
+                        last_flush = 0.0
+
+                        async def flush_logs(force: bool = False):
+                            nonlocal logs_dirty, last_flush
+                            if not logs_dirty:
+                                return
+                            now = time.monotonic()
+                            if not force and now - last_flush < LOG_UI_MIN_UPDATE_INTERVAL_SECONDS:
                                 return
+                            logs_dirty = False
+                            # Update UI with latest logs; lines are only
+                            # formatted here, so evicted events never are
+                            output = "\n".join(
+                                f"[{level}] [{ts}] {msg}"
+                                for level, ts, msg in accumulated_logs
+                            )
+                            if output == step.output:
+                                # Visible tail unchanged (e.g. repeated lines): no frame to send
+                                return
+                            step.output = output
+                            await step.update()
+                            last_flush = now
+
+                        try:
+                            # Enforce the deadline here as well so the subscription
+                            # (and its Redis read) is cancelled, not left dangling
+                            async with asyncio.timeout(LOG_STREAM_TIMEOUT), aclosing(
+                                _iter_log_batches(
+                                    log_streamer.subscribe_logs(
+                                        job_id, timeout=LOG_STREAM_TIMEOUT
+                                    ),
+                                    # Trailing-edge flush: lines held back by the rate
+                                    # limit are drawn once the stream goes quiet
+                                    idle_timeout=LOG_UI_MIN_UPDATE_INTERVAL_SECONDS,
+                                )
+                            ) as log_batches:
+                                async for log_batch in log_batches:
+                                    for log_event in log_batch:
+                                        # Handle log messages
+                                        if "message" in log_event:
+                                            accumulated_logs.append(
+                                                (
+                                                    log_event.get("level", "INFO"),
+                                                    log_event.get("timestamp", "")[:8],  # HH:MM:SS
+                                                    log_event["message"],
+                                                )
+                                            )
+                                            logs_dirty = True
+
+                                        # Handle status changes
+                                        if "status" in log_event:
+                                            status = log_event["status"]
+                                            await flush_logs(force=True)
+
+                                            if status == "completed":
+                                                tool_result = log_event.get("result")
+                                                # Delegate handling to helper function; if it returns True, we should return from main.
+                                                if await _handle_tool_result(tool_result):
+                                                    return
+
+                                            elif status == "failed":
+                                                error = log_event.get("error", "Unknown error")
+                                                await cl.Message(
+                                                    content=f"❌ **Job Failed:** {error}"
+                                                ).send()
+                                                return
 
-                            finally:
-                                await log_streamer.close()
+                                    # At most one UI update per batch, rate limited
+                                    # (an empty batch means the stream went quiet)
+                                    await flush_logs(force=not log_batch)
 
-                        except ImportError:
-                            logger.warning("Redis not available, falling back to polling")
-                            enable_streaming = False
+                            # Stream ended: show whatever the rate limit held back
+                            await flush_logs(force=True)
 
-                        except Exception as e:
-                            logger.error(f"Streaming error: {e}", exc_info=True)
+                        except asyncio.TimeoutError:
                             await cl.Message(
-                                content=f"⚠️ Streaming unavailable, falling back to polling: {e}"
+                                content="⏱️ Job is still running. Check back later."
                             ).send()
-                            enable_streaming = False
+                            return
 
-                    # Fallback to polling if streaming is disabled or failed
-                    if not enable_streaming:
-                        await _polling_for_job(job_id, step, user_id=user_id)
-                    # Job handling is complete, return
-                    return
-            else:
-                # Not a job response, send the message and continue to next response
-                await cl.Message(content=response_text).send()
-                continue
+                    except ImportError:
+                        logger.warning("Redis not available, falling back to polling")
+                        enable_streaming = False
+
+                    except Exception as e:
+                        logger.error(f"Streaming error: {e}", exc_info=True)
+                        await cl.Message(
+                            content=f"⚠️ Streaming unavailable, falling back to polling: {e}"
+                        ).send()
+                        enable_streaming = False
+
+                # Fallback to polling if streaming is disabled or failed
+                if not enable_streaming:
+                    await _polling_for_job(job_id, step, user_id=user_id)
+                # Job handling is complete, return
+                return
 
         # If no responses were found, fall back to original extraction
         if not all_responses:
-            response_text = _extract_response(result.get("messages", []))
+            response_text = _extract_response(result_messages)
             if response_text:
+                # Plain prose is by far the common case: only pay for a JSON parse
+                # when the response actually starts like a JSON object/array
+                # (looks at the first non-whitespace character without copying the text)
+                lead = next((ch for ch in response_text if not ch.isspace()), "")
+                if lead not in ("{", "["):
+                    await cl.Message(content=response_text).send()
+                    return
                 try:
                     # Try to parse response as JSON
-                    response_json = json.loads(response_text)
+                    response_json = orjson.loads(response_text)
 
                     if "status" in response_json:
-                        if response_json["status"] == "completed":
-                            tool_result = response_json["result"]
-
-                            # Delegate handling to helper function; if it returns True, we should return from main.
-                            if await _handle_tool_result(tool_result):
-                                return
-
-                        if response_json["status"] == "failed":
-                            await cl.Message(content="❌ **Job Failed.**").send()
+                        # Dispatch on status; a handler returning True is terminal
+                        handler = _STATUS_HANDLERS.get(response_json["status"])
+                        if handler and await handler(response_json):
                             return
-
-                        if "logs" in response_json:
+                        elif "logs" in response_json:
                             await cl.Message(content=response_json["logs"]).send()
                             return
                     else:
                         await cl.Message(content=response_text).send()
-                except json.JSONDecodeError:
+                except orjson.JSONDecodeError:
                     # Fallback to plain text response
                     await cl.Message(content=response_text).send()
 
@@ -594,6 +797,10 @@ async def on_chat_resume(thread: ThreadDict):
     pass
 
 
+# Google Workspace domains (the "hd" claim) allowed to sign in
+_ALLOWED_HD = frozenset({"wizeline.com"})
+
+
 @cl.oauth_callback
 async def oauth_callback(
     provider_id: str,
@@ -602,7 +809,8 @@ async def oauth_callback(
     default_user: cl.User,
     context: Optional[str] = None,
 ) -> Optional[cl.User]:
-    if provider_id == "google" and raw_user_data["hd"] == "wizeline.com":
+    # Personal Google accounts carry no "hd" claim: reject them instead of raising KeyError
+    if provider_id == "google" and raw_user_data.get("hd") in _ALLOWED_HD:
         return default_user
     return None
 
@@ -622,28 +830,88 @@ async def _handle_tool_result(tool_result) -> bool:
         return True
 
     if isinstance(tool_result, dict):
+        # Deliver html/code/text as a single message: one send and one render pass
+        elements = []
+        parts = []
         if "html" in tool_result and tool_result["html"]:
             html_viewer_element = cl.CustomElement(
                 name="RawHtmlRenderElement", props={"htmlString": tool_result["html"]}
             )
             # Store the element if we want to update it server side at a later stage.
             cl.user_session.set("html_viewer_el", html_viewer_element)
-            await cl.Message(content="", elements=[html_viewer_element]).send()
+            elements.append(html_viewer_element)
 
         if "code" in tool_result and tool_result["code"]:
-            await cl.Message(
-                content=f"### 📦 Final Code\n```python\n{tool_result['code']}\n```"
-            ).send()
+            parts.append(f"### 📦 Final Code\n```python\n{tool_result['code']}\n```")
 
         if "text" in tool_result and tool_result["text"]:
-            await cl.Message(content=f"{tool_result['text']}").send()
+            parts.append(f"{tool_result['text']}")
 
+        if elements or parts:
+            await cl.Message(content="\n\n".join(parts), elements=elements).send()
         return True
 
     return False
 
 
-def _extract_all_responses(messages: list[BaseMessage], only_recent: bool = False) -> list[str]:
+async def _handle_completed_status(response_json: Dict[str, Any]) -> bool:
+    """Render the result of a completed job; returns True if handling is terminal."""
+    return await _handle_tool_result(response_json["result"])
+
+
+async def _handle_failed_status(response_json: Dict[str, Any]) -> bool:
+    """Report a failed job; always terminal."""
+    await cl.Message(content="❌ **Job Failed.**").send()
+    return True
+
+
+_STATUS_HANDLERS = {
+    "completed": _handle_completed_status,
+    "failed": _handle_failed_status,
+}
+
+
+def _handler_response_text(message: BaseMessage) -> Optional[str]:
+    """Return the content of a handler response (AI message without tool_calls), else None."""
+    if not isinstance(message, AIMessage):
+        return None
+    content = message.content
+    if not content:
+        return None
+
+    # Skip messages with tool_calls (these are tool invocation messages, not handler responses)
+    if getattr(message, "tool_calls", None):
+        logger.debug("🔍 [Extract] Skipping AI message with tool_calls")
+        return None
+
+    if not isinstance(content, str):
+        content = str(content)
+    logger.debug(f"🔍 [Extract] Found AI message without tool_calls, content preview: {content[:100]}")
+
+    # Filter out text that looks like function calls (LLM generating code instead of using tools)
+    content_stripped = content.strip()
+
+    # Skip empty content
+    if not content_stripped:
+        return None
+
+    # Exact call, call at the start, or call followed by output
+    if _starts_with_function_call(content_stripped):
+        return None
+
+    return content
+
+
+def _current_turn_start(messages: list[BaseMessage]) -> int:
+    """Index right after the most recent human message (0 if there is none)."""
+    # The current turn sits at the tail, so the backwards scan stops after a few messages
+    for idx in range(len(messages) - 1, -1, -1):
+        if isinstance(messages[idx], HumanMessage):
+            return idx + 1
+    return 0
+
+
+def _extract_all_responses(messages: list[BaseMessage], start_idx: int = 0) -> list[str]:
     """
     Extract all handler responses (AI messages without tool_calls) from messages.
     This is used for multi-step workflows where multiple tools are called and each
@@ -651,63 +919,23 @@ def _extract_all_responses(messages: list[BaseMessage], only_recent: bool = Fals
 
     Args:
         messages: List of messages to extract from
-        only_recent: If True, only extract responses after the most recent human message
-                     (i.e., only responses from the current query execution)
+        start_idx: Index of the first message to consider; pass _current_turn_start(messages)
+                   to only extract responses from this query
 
     Returns:
         A list of response strings in order.
     """
-    responses = []
+    # Fast path: a direct answer (no tool rounds) adds exactly one message
+    if len(messages) - start_idx == 1:
+        content = _handler_response_text(messages[-1])
+        return [content] if content is not None else []
 
-    # If only_recent is True, find the index of the most recent human message
-    start_idx = 0
-    if only_recent:
-        for idx in range(len(messages) - 1, -1, -1):
-            if hasattr(messages[idx], "type") and messages[idx].type == "human":
-                start_idx = idx + 1  # Start from the message after the human message
-                logger.debug(f"🔍 [Extract] Only extracting responses after human message at index {idx}, starting from index {start_idx}")
-                break
+    responses = []
 
     logger.debug(f"🔍 [Extract] Processing {len(messages)} messages (starting from index {start_idx}) to extract handler responses")
-    for idx in range(start_idx, len(messages)):
-        message = messages[idx]
-        if isinstance(message, AIMessage) and message.content:
-            content = str(message.content)
-
-            # Skip messages with tool_calls (these are tool invocation messages, not handler responses)
-            if getattr(message, "tool_calls", None):
-                logger.debug(f"🔍 [Extract] Message {idx}: Skipping AI message with tool_calls")
-                continue
-
-            logger.debug(f"🔍 [Extract] Message {idx}: Found AI message without tool_calls, content preview: {content[:100]}")
-
-            # Filter out text that looks like function calls (LLM generating code instead of using tools)
-            import re
-            content_stripped = content.strip()
-
-            # Skip empty content
-            if not content_stripped:
-                continue
-
-            # Pattern 1: Exact function call match
-            function_call_pattern = r"^\s*\w+\s*\([^)]*\)\s*$"
-            if re.match(function_call_pattern, content_stripped, re.MULTILINE):
-                continue
-
-            # Pattern 2: Function call at the start
-            if re.match(r"^\s*\w+\s*\([^)]*\)", content_stripped):
-                continue
-
-            # Pattern 3: Function call followed by newline
-            if re.match(r"^\s*\w+\s*\([^)]*\)\s*\n", content_stripped):
-                continue
-
-            # Pattern 4: Short standalone function call
-            if len(content_stripped) < 200 and re.match(
-                r"^\s*\w+\s*\([^)]*\)", content_stripped
-            ):
-                continue
-
+    for idx, message in enumerate(islice(messages, start_idx, None), start_idx):
+        content = _handler_response_text(message)
+        if content is not None:
             # This is a valid handler response, add it
             logger.debug(f"✅ [Extract] Message {idx}: Added as handler response")
             responses.append(content)
@@ -720,122 +948,196 @@ def _extract_response(messages: list[BaseMessage]) -> str:
     """
     Extract the final AI response from messages.
     Filters out tool call syntax that the LLM might generate as text.
+    Only the last _EXTRACT_RESPONSE_SCAN_LIMIT messages are inspected.
     """
-    for message in reversed(messages):
-        if isinstance(message, AIMessage) and message.content:
-            content = str(message.content)
-
-            # Check if this message has actual tool_calls (proper tool calling)
-            if getattr(message, "tool_calls", None):
-                # If it has tool_calls, the tools should have been executed
-                # Don't show the tool call syntax, wait for the result
-                logger.debug(
-                    f"Message has tool_calls, skipping content: {content[:100]}"
-                )
-                continue
-
-            # Filter out text that looks like function calls (LLM generating code instead of using tools)
-            # This is a generic pattern that works for any tool
-            import re
-
-            content_stripped = content.strip()
-
-            # Pattern 1: Exact function call match: function_name(param="value", param2="value2")
-            # Match: word characters, optional whitespace, opening paren, any content, closing paren, optional whitespace
-            function_call_pattern = r"^\s*\w+\s*\([^)]*\)\s*$"
-            if re.match(function_call_pattern, content_stripped, re.MULTILINE):
-                logger.warning(
-                    f"❌ [Main] LLM generated function call syntax instead of using tools: {content_stripped}"
-                )
-                # Return a helpful message instead of showing the function call
-                return "I need to use the available tools to complete this request. Let me try again."
-
-            # Pattern 2: Function call at the start (even if there's more text after)
-            # This catches cases like "search_code(...) and then some explanation" or "scan_directory(...)\n[...]"
-            if re.match(r"^\s*\w+\s*\([^)]*\)", content_stripped):
-                logger.warning(
-                    f"❌ [Main] LLM generated function call syntax at start of response: {content_stripped[:200]}"
-                )
-                # If there's content after the function call, it might be tool output - extract just the function call part
-                # But for now, just filter the whole thing
-                return "I need to use the available tools to complete this request. Let me try again."
-
-            # Pattern 3: Function call followed by JSON/list output (LLM generated code + tool result mixed)
-            # Catches: "function_name(...)\n[{...}]" or "function_name(...)\n[...]"
-            if re.match(r"^\s*\w+\s*\([^)]*\)\s*\n", content_stripped):
-                logger.warning(
-                    f"❌ [Main] LLM generated function call syntax followed by output: {content_stripped[:300]}"
-                )
-                return "I need to use the available tools to complete this request. Let me try again."
-
-            # Pattern 4: Check for common function call patterns (more lenient)
-            # Catches: function_name(...) with any spacing
-            if re.search(r"\w+\s*\([^)]+\)", content_stripped):
-                # Only flag if it looks like a standalone function call (not part of explanation)
-                # If the content is mostly just a function call, filter it
-                if len(content_stripped) < 200 and re.match(
-                    r"^\s*\w+\s*\([^)]*\)", content_stripped
-                ):
-                    logger.warning(
-                        f"❌ [Main] LLM generated function call syntax (lenient match): {content_stripped}"
-                    )
-                    return "I need to use the available tools to complete this request. Let me try again."
+    stop = max(-1, len(messages) - 1 - _EXTRACT_RESPONSE_SCAN_LIMIT)
+    for idx in range(len(messages) - 1, stop, -1):
+        message = messages[idx]
+        # isinstance (not an exact type check): AIMessageChunk subclasses must still count
+        if not isinstance(message, AIMessage):
+            continue
+        content = message.content
+        if not content:
+            continue
+        if not isinstance(content, str):
+            content = str(content)
+
+        # Check if this message has actual tool_calls (proper tool calling)
+        if getattr(message, "tool_calls", None):
+            # If it has tool_calls, the tools should have been executed
+            # Don't show the tool call syntax, wait for the result
+            logger.debug(
+                f"Message has tool_calls, skipping content: {content[:100]}"
+            )
+            continue
+
+        # Filter out text that looks like function calls (LLM generating code instead of using tools)
+        # This is a generic pattern that works for any tool
+        content_stripped = content.strip()
+
+        # One match covers every function-call shape: exact call, call at the start,
+        # or call followed by output
+        # Catches: "function_name(...)", "search_code(...) and then some explanation",
+        # and "function_name(...)\n[{...}]"
+        # Ordinary prose is rejected by cheap string checks before the regex runs
+        if _starts_with_function_call(content_stripped):
+            logger.warning(
+                f"❌ [Main] LLM generated function call syntax instead of using tools: {content_stripped[:300]}"
+            )
+            # Return a helpful message instead of showing the function call
+            return "I need to use the available tools to complete this request. Let me try again."
 
-            return content
+        return content
     return ""
 
 
+async def _iter_log_batches(
+    log_events: AsyncIterator[Dict[str, Any]],
+    max_events: int = LOG_COALESCE_MAX_EVENTS,
+    window: float = LOG_COALESCE_WINDOW_SECONDS,
+    idle_timeout: Optional[float] = None,
+) -> AsyncIterator[list[Dict[str, Any]]]:
+    """
+    Group log events that arrive in bursts so the caller updates the UI once per batch.
+
+    A batch is closed when it holds max_events events or when no further event
+    arrives within window seconds of the first one. If idle_timeout is set and the
+    stream goes quiet that long after a batch, one empty batch is yielded so the
+    caller can flush anything it held back. Errors raised by the underlying stream
+    (e.g. a subscribe timeout) are re-raised to the caller after any pending batch
+    has been yielded.
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+    end_of_stream = object()
+
+    async def pump():
+        try:
+            async for event in log_events:
+                queue.put_nowait(event)
+        except Exception as e:
+            queue.put_nowait(e)
+        else:
+            queue.put_nowait(end_of_stream)
+
+    loop = asyncio.get_running_loop()
+    reader = asyncio.create_task(pump())
+    signal_idle = False
+    try:
+        while True:
+            if signal_idle and idle_timeout is not None:
+                try:
+                    item = await asyncio.wait_for(queue.get(), timeout=idle_timeout)
+                except asyncio.TimeoutError:
+                    # Quiet after a batch: wake the caller once, then wait for the next event
+                    signal_idle = False
+                    yield []
+                    continue
+            else:
+                item = await queue.get()
+            batch = []
+            deadline = loop.time() + window
+            while item is not end_of_stream and not isinstance(item, Exception):
+                batch.append(item)
+                if len(batch) >= max_events:
+                    item = None
+                    break
+                if not queue.empty():
+                    item = queue.get_nowait()
+                    continue
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    item = None
+                    break
+                try:
+                    item = await asyncio.wait_for(queue.get(), timeout=remaining)
+                except asyncio.TimeoutError:
+                    item = None
+                    break
+
+            if batch:
+                signal_idle = True
+                yield batch
+            if item is end_of_stream:
+                return
+            if isinstance(item, Exception):
+                raise item
+    finally:
+        reader.cancel()
+
+
+def _log_tail(logs: str, lines: int = JOB_LOG_TAIL) -> str:
+    """Return the last `lines` lines of a log text without splitting all of it."""
+    # Trailing newlines terminate the last line, they don't start another one
+    pos = len(logs.rstrip("\n"))
+    for _ in range(lines):
+        pos = logs.rfind("\n", 0, pos)
+        if pos < 0:
+            return logs
+    return logs[pos + 1:]
+
+
 async def _polling_for_job(job_id: str, step: cl.Step, user_id: Optional[str] = None):
     last_logs = ""
+    last_raw = None
     job_status = ""
     uid = user_id or cl.user_session.get("user_id") or _get_user_id()
+    poll_interval = POLL_INTERVAL_INITIAL_SECONDS
 
-    # Apply optional timeout from TASK_TIMEOUT (seconds)
-    timeout = float(TASK_TIMEOUT)
-    start_time = time.monotonic()
+    # Apply optional timeout from TASK_TIMEOUT (seconds); the deadline cancels
+    # whatever is in flight (sleep or status call) instead of being checked per poll
+    try:
+        async with asyncio.timeout(TASK_TIMEOUT) as deadline:
+            while job_status not in ["completed", "failed"]:
+                await asyncio.sleep(poll_interval)
+                poll_interval = min(poll_interval * POLL_BACKOFF_FACTOR, POLL_INTERVAL_MAX_SECONDS)
 
-    while job_status not in ["completed", "failed"]:
-        await asyncio.sleep(1)
+                # Call tool via agent_runtime (Reuse existing connection for this user)
+                try:
+                    # A hung status call must not stall polling until the overall deadline
+                    job = await asyncio.wait_for(
+                        agent_runtime.call_tool(
+                            "get_job_status",
+                            {"job_id": job_id},
+                            user_id=uid,
+                        ),
+                        timeout=POLL_CALL_TIMEOUT_SECONDS,
+                    )
+                    # Extract text
+                    raw = job.content[0].text
+                    if raw == last_raw:
+                        # Identical payload to the previous poll: nothing new to parse or show
+                        continue
+                    job_result = orjson.loads(raw)
+                    last_raw = raw
+                except Exception as e:
+                    job_result = {"error": f"Error polling: {e}"}
+
+                # Update UI with the tail of the logs (same view as the streaming branch);
+                # only the tail is kept, so the full log text is not retained between polls
+                logs_tail = _log_tail(job_result["logs"]) if job_result.get("logs") else ""
+                if logs_tail and logs_tail != last_logs:
+                    step.output = logs_tail
+                    await step.update()
+                    last_logs = logs_tail
+                    # Job is making progress, keep polling it closely
+                    poll_interval = POLL_INTERVAL_INITIAL_SECONDS
 
-        # Check for timeout
-        if (time.monotonic() - start_time) > timeout:
-            await cl.Message(
-                content=f"⏳ **Timeout:** Job {job_id} takes too long to complete. You may check it status later."
-            ).send()
-            return
+                if "status" in job_result:
+                    job_status = job_result["status"]
 
-        # Call tool via agent_runtime (Reuse existing connection for this user)
-        try:
-            job = await agent_runtime.call_tool(
-                "get_job_status",
-                {"job_id": job_id},
-                user_id=uid,
-            )
-            # Extract text
-            job_result = json.loads(job.content[0].text)
-        except Exception as e:
-            job_result = {"error": f"Error polling: {e}"}
-
-        # Update UI
-        if (
-            "logs" in job_result
-            and job_result["logs"]
-            and job_result["logs"] != last_logs
-        ):
-            step.output = job_result["logs"]
-            await step.update()
-            last_logs = job_result["logs"]
-
-        if "status" in job_result:
-            job_status = job_result["status"]
-
-            if job_result["status"] == "completed":
-                tool_result = job_result["result"]
-
-                # Delegate handling to helper function; if it returns True, we should return from main.
-                if await _handle_tool_result(tool_result):
-                    return
+                    if job_result["status"] == "completed":
+                        tool_result = job_result["result"]
 
-            if job_result["status"] == "failed":
-                await cl.Message(content="❌ **Job Failed.**").send()
-                return
+                        # Delegate handling to helper function; if it returns True, we should return from main.
+                        if await _handle_tool_result(tool_result):
+                            return
+
+                    if job_result["status"] == "failed":
+                        await cl.Message(content="❌ **Job Failed.**").send()
+                        return
+    except TimeoutError:
+        if not deadline.expired():
+            raise
+        await cl.Message(
+            content=f"⏳ **Timeout:** Job {job_id} takes too long to complete. You may check it status later."
+        ).send()
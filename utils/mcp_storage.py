@@ -12,10 +12,11 @@ MEMORY MANAGEMENT:
 - Cleanup runs periodically when storage is accessed
 """
 
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Tuple
 import logging
 import time
 import threading
+import weakref
 
 logger = logging.getLogger(__name__)
 
@@ -23,6 +24,11 @@ logger = logging.getLogger(__name__)
 # Structure: user_id -> server_name -> server_config
 _mcp_servers: Dict[str, Dict[str, Dict[str, Any]]] = {}
 
+# Live MCP client sessions, kept apart from the (plain data) server metadata above
+# Structure: (user_id, server_name) -> ClientSession
+# Weak references: a session disappears once Chainlit drops it on disconnect
+_live_sessions: "weakref.WeakValueDictionary[Tuple[str, str], Any]" = weakref.WeakValueDictionary()
+
 # Per-user last activity timestamp for TTL-based cleanup
 # Structure: user_id -> last_activity_timestamp
 _user_last_activity: Dict[str, float] = {}
@@ -45,6 +51,10 @@ _removed_servers: Dict[str, Dict[str, float]] = {}
 # Default user ID for backward compatibility (single-user mode)
 DEFAULT_USER_ID = "__default__"
 
+# Bumped on every change to _mcp_servers so derived data (prompt guides,
+# handler metadata) can skip rebuilding when nothing changed
+_mcp_version: int = 0
+
 
 # Callbacks for cleanup notifications (allows other modules to sync cleanup)
 _cleanup_callbacks: list = []
@@ -89,6 +99,8 @@ def _cleanup_inactive_users() -> int:
     for user_id in users_to_remove:
         if user_id in _mcp_servers:
             del _mcp_servers[user_id]
+            _bump_version()
+        _drop_live_sessions(user_id)
         if user_id in _removed_servers:
             del _removed_servers[user_id]
         if user_id in _user_last_activity:
@@ -109,6 +121,17 @@ def _cleanup_inactive_users() -> int:
     return cleaned_count
 
 
+def _bump_version() -> None:
+    """Record that the MCP server storage has changed."""
+    global _mcp_version
+    _mcp_version += 1
+
+
+def get_mcp_version() -> int:
+    """Get the current storage version (changes whenever any MCP server is added/removed)."""
+    return _mcp_version
+
+
 def _touch_user(user_id: str) -> None:
     """Update last activity timestamp for a user."""
     _user_last_activity[user_id] = time.time()
@@ -123,14 +146,16 @@ def get_mcp_servers(user_id: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
     return _mcp_servers.get(uid, {}).copy()
 
 
-def add_mcp_server(server_name: str, server_config: Dict[str, Any], user_id: Optional[str] = None) -> None:
-    """Add or update an MCP server for a specific user."""
+def upsert_mcp_server(server_name: str, server_config: Dict[str, Any], user_id: Optional[str] = None) -> bool:
+    """Add or update an MCP server for a specific user. Returns True if it already existed."""
     uid = user_id or DEFAULT_USER_ID
     _touch_user(uid)
-    if uid not in _mcp_servers:
-        _mcp_servers[uid] = {}
-    _mcp_servers[uid][server_name] = server_config
-    logger.info(f"✅ [Storage] Added/updated MCP server '{server_name}' for user '{uid}'")
+    user_servers = _mcp_servers.setdefault(uid, {})
+    existed = server_name in user_servers
+    user_servers[server_name] = server_config
+    _bump_version()
+    logger.info(f"✅ [Storage] {'Updated' if existed else 'Added'} MCP server '{server_name}' for user '{uid}'")
+    return existed
 
 
 def remove_mcp_server(server_name: str, user_id: Optional[str] = None) -> None:
@@ -140,6 +165,8 @@ def remove_mcp_server(server_name: str, user_id: Optional[str] = None) -> None:
 
     if uid in _mcp_servers and server_name in _mcp_servers[uid]:
         del _mcp_servers[uid][server_name]
+        _bump_version()
+        _live_sessions.pop((uid, server_name), None)
         logger.info(f"✅ [Storage] Removed MCP server '{server_name}' for user '{uid}'")
     else:
         logger.debug(f"⚠️ [Storage] MCP server '{server_name}' not found for user '{uid}'")
@@ -153,10 +180,22 @@ def remove_mcp_server(server_name: str, user_id: Optional[str] = None) -> None:
     )
 
 
-def get_mcp_server(server_name: str, user_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
-    """Get a specific MCP server for a user."""
+def set_live_session(server_name: str, session: Any, user_id: Optional[str] = None) -> None:
+    """Register the live MCP client session for a user's server."""
     uid = user_id or DEFAULT_USER_ID
-    return _mcp_servers.get(uid, {}).get(server_name)
+    _live_sessions[(uid, server_name)] = session
+
+
+def get_live_session(server_name: str, user_id: Optional[str] = None) -> Optional[Any]:
+    """Get the live MCP client session for a user's server (None if gone)."""
+    uid = user_id or DEFAULT_USER_ID
+    return _live_sessions.get((uid, server_name))
+
+
+def _drop_live_sessions(user_id: str) -> None:
+    """Forget all live sessions registered for a user."""
+    for key in [key for key in list(_live_sessions.keys()) if key[0] == user_id]:
+        _live_sessions.pop(key, None)
 
 
 def clear_all(user_id: Optional[str] = None) -> None:
@@ -164,36 +203,16 @@ def clear_all(user_id: Optional[str] = None) -> None:
     if user_id:
         if user_id in _mcp_servers:
             _mcp_servers[user_id].clear()
+            _bump_version()
+        _drop_live_sessions(user_id)
         logger.info(f"✅ [Storage] Cleared MCP servers for user '{user_id}'")
     else:
         _mcp_servers.clear()
+        _live_sessions.clear()
+        _bump_version()
         logger.info("✅ [Storage] Cleared all MCP server metadata for all users")
 
 
-def is_server_removed(server_name: str, user_id: Optional[str] = None) -> bool:
-    """Check if a server was recently removed for a user and is still in cooldown."""
-    uid = user_id or DEFAULT_USER_ID
-
-    if uid not in _removed_servers or server_name not in _removed_servers[uid]:
-        return False
-
-    removal_time = _removed_servers[uid][server_name]
-    time_since_removal = time.time() - removal_time
-
-    if time_since_removal < REMOVAL_COOLDOWN_SECONDS:
-        logger.debug(
-            f"🚫 [Storage] '{server_name}' is in removal cooldown for user '{uid}' ({time_since_removal:.1f}s < {REMOVAL_COOLDOWN_SECONDS}s)"
-        )
-        return True
-    else:
-        # Cooldown expired, remove from blacklist
-        logger.info(
-            f"✅ [Storage] Cooldown expired for '{server_name}' (user '{uid}'), allowing reconnect"
-        )
-        del _removed_servers[uid][server_name]
-        return False
-
-
 def clear_removed_servers(user_id: Optional[str] = None) -> None:
     """Clear the removed servers list for a user (or all users if user_id is None)."""
     if user_id:
@@ -215,14 +234,29 @@ def allow_server_reconnect(server_name: str, user_id: Optional[str] = None) -> N
         )
 
 
-def get_removal_cooldown_remaining(server_name: str, user_id: Optional[str] = None) -> float:
-    """Get remaining cooldown time for a removed server (0 if not in cooldown)."""
+def get_removal_state(server_name: str, user_id: Optional[str] = None) -> Optional[float]:
+    """
+    Get the removal cooldown state of a server for a user in a single lookup.
+
+    Returns:
+        None if the server is not in cooldown (expired entries are cleared),
+        otherwise the remaining cooldown in seconds
+    """
     uid = user_id or DEFAULT_USER_ID
-    if uid not in _removed_servers or server_name not in _removed_servers[uid]:
-        return 0
-    removal_time = _removed_servers[uid][server_name]
+    removal_time = _removed_servers.get(uid, {}).get(server_name)
+    if removal_time is None:
+        return None
+
     remaining = REMOVAL_COOLDOWN_SECONDS - (time.time() - removal_time)
-    return max(0, remaining)
+    if remaining > 0:
+        return remaining
+
+    # Cooldown expired, remove from blacklist
+    logger.info(
+        f"✅ [Storage] Cooldown expired for '{server_name}' (user '{uid}'), allowing reconnect"
+    )
+    del _removed_servers[uid][server_name]
+    return None
 
 
 def get_user_count() -> int:
@@ -280,7 +314,9 @@ def cleanup_user(user_id: str) -> bool:
     found = False
     if user_id in _mcp_servers:
         del _mcp_servers[user_id]
+        _bump_version()
         found = True
+    _drop_live_sessions(user_id)
     if user_id in _removed_servers:
         del _removed_servers[user_id]
         found = True
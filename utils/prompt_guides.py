@@ -1,4 +1,4 @@
-from utils.mcp_storage import get_mcp_servers
+from utils.mcp_storage import get_mcp_servers, get_mcp_version
 from typing import Dict, Any
 
 def get_prompt_template(guides: str) -> str:
@@ -61,9 +61,14 @@ def _generate_prompt_guides() -> str:
 
 
 prompt_guides = _generate_prompt_guides()
+_prompt_guides_version = get_mcp_version()
 
 
 def refresh_prompt_guides() -> None:
-    """Refresh the global prompt guides variable."""
-    global prompt_guides
+    """Refresh the global prompt guides variable (no-op if MCP storage is unchanged)."""
+    global prompt_guides, _prompt_guides_version
+    version = get_mcp_version()
+    if version == _prompt_guides_version:
+        return
     prompt_guides = _generate_prompt_guides()
+    _prompt_guides_version = version
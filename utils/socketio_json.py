@@ -0,0 +1,39 @@
+"""
+orjson-backed JSON codec for Chainlit's Socket.IO transport.
+
+Chainlit delivers every message, step and element to the browser through
+python-socketio, which serializes packets with the stdlib json module. For
+large payloads (HTML viewers, final code blocks) that serialization dominates
+the cost of a send. python-socketio allows swapping the json module used for
+packets, so this module exposes a json-compatible dumps/loads pair backed by
+orjson, falling back to the stdlib for anything orjson does not support.
+"""
+
+import json
+import sys
+from typing import Any
+
+import orjson
+
+# Allow non-string dict keys the same way the stdlib does (they are stringified)
+_ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS
+
+
+def dumps(obj: Any, **kwargs: Any) -> str:
+    """Serialize obj to a JSON string (kwargs only apply to the stdlib fallback)."""
+    try:
+        return orjson.dumps(obj, option=_ORJSON_OPTIONS).decode()
+    except TypeError:
+        return json.dumps(obj, **kwargs)
+
+
+def loads(s: Any, **kwargs: Any) -> Any:
+    """Deserialize a JSON document from str or bytes."""
+    return orjson.loads(s)
+
+
+def install() -> None:
+    """Make python-socketio encode and decode packets with this module."""
+    from socketio import packet
+
+    packet.Packet.json = sys.modules[__name__]
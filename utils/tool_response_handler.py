@@ -15,11 +15,23 @@ MULTI-USER SUPPORT:
 import json
 import logging
 from typing import Dict, Any, Optional
+
+import orjson
 from langchain_core.messages import ToolMessage, AIMessage
-from utils.mcp_storage import get_mcp_servers
+from utils.mcp_storage import DEFAULT_USER_ID, get_all_user_ids, get_mcp_servers, get_mcp_version
 
 logger = logging.getLogger(__name__)
 
+_PRETTY_JSON_OPTIONS = orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS
+
+
+def format_json(data: Any) -> str:
+    """Pretty-print data as 2-space indented JSON (orjson, stdlib fallback for unsupported types)."""
+    try:
+        return orjson.dumps(data, option=_PRETTY_JSON_OPTIONS).decode()
+    except TypeError:
+        return json.dumps(data, indent=2)
+
 
 class ToolResponseHandler:
     """Handles tool responses based on metadata from agent code (via MCP protocol)."""
@@ -29,6 +41,8 @@ class ToolResponseHandler:
         # Per-user metadata storage to prevent cross-user interference
         # Structure: user_id -> tool_name -> metadata
         self._user_tool_metadata: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        # Storage version each user's metadata was loaded at (see mcp_storage.get_mcp_version)
+        self._user_metadata_versions: Dict[str, int] = {}
         # Note: Don't load metadata in __init__ since we need user_id context
         # Metadata will be refreshed when MCP servers connect
 
@@ -52,7 +66,6 @@ class ToolResponseHandler:
                 agents_config = get_mcp_servers(user_id=user_id)
             else:
                 # For global refresh (like on startup), get all users' servers
-                from utils.mcp_storage import get_all_user_ids
                 agents_config = {}
                 for uid in get_all_user_ids():
                     user_servers = get_mcp_servers(user_id=uid)
@@ -232,23 +245,22 @@ class ToolResponseHandler:
             if isinstance(content, str):
                 try:
                     # Try to parse and re-format for pretty printing
-                    parsed = json.loads(content)
-                    return json.dumps(parsed, indent=2)
-                except json.JSONDecodeError:
+                    parsed = orjson.loads(content)
+                    return format_json(parsed)
+                except orjson.JSONDecodeError:
                     return content
             else:
-                return json.dumps(content, indent=2)
+                return format_json(content)
         else:  # auto
             if isinstance(content, str):
                 return content
             elif isinstance(content, (dict, list)):
-                return json.dumps(content, indent=2)
+                return format_json(content)
             else:
                 return str(content)
 
     def _get_user_metadata(self, user_id: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
         """Get metadata for a specific user."""
-        from utils.mcp_storage import DEFAULT_USER_ID
         uid = user_id or DEFAULT_USER_ID
         return self._user_tool_metadata.get(uid, {})
 
@@ -355,7 +367,7 @@ class ToolResponseHandler:
                             and extract_path == "content[0].text"
                         ):
                             # For dict responses, return the dict as JSON string for direct mode
-                            value = json.dumps(parsed, indent=2)
+                            value = format_json(parsed)
                         else:
                             value = self._extract_value(
                                 {"content": parsed}, extract_path
@@ -429,14 +441,19 @@ class ToolResponseHandler:
         Args:
             user_id: User ID to refresh metadata for. Required for per-user isolation.
         """
-        from utils.mcp_storage import DEFAULT_USER_ID
         uid = user_id or DEFAULT_USER_ID
 
+        version = get_mcp_version()
+        if self._user_metadata_versions.get(uid) == version:
+            logger.debug(f"[Handler] Metadata for user '{uid}' is up to date (version {version})")
+            return
+
         logger.info(f"🔄 [Handler] Refreshing tool response metadata from storage (user_id={uid})")
 
         old_tools = set(self._user_tool_metadata.get(uid, {}).keys())
         new_metadata = self._load_tool_metadata(user_id=uid)
         self._user_tool_metadata[uid] = new_metadata
+        self._user_metadata_versions[uid] = version
         new_tools = set(new_metadata.keys())
 
         logger.info(
@@ -459,6 +476,7 @@ class ToolResponseHandler:
         Args:
             user_id: User ID to clear metadata for
         """
+        self._user_metadata_versions.pop(user_id, None)
         if user_id in self._user_tool_metadata:
             del self._user_tool_metadata[user_id]
             logger.info(f"🧹 [Handler] Cleared metadata for user '{user_id}'")